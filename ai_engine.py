@@ -1,39 +1,79 @@
 # ai_engine.py
-from openai import OpenAI
-from config import OPENROUTER_API_KEY, OPENROUTER_MODEL, OPENROUTER_SITE_URL, OPENROUTER_SITE_NAME
+import asyncio
+import json
+import re
+from config import OPENROUTER_API_KEY, OPENROUTER_BASE_URL, OPENROUTER_MODEL, OPENROUTER_SITE_URL, OPENROUTER_SITE_NAME
+from response_cache import ResponseCache
 
 class AIProcessor:
     def __init__(self):
         if not OPENROUTER_API_KEY or "sk-or-v1" not in OPENROUTER_API_KEY:
             raise ValueError("OpenRouter API Key is missing or invalid in config.py or .env file")
+        # openai takes most of a second to import, so it's only loaded once the key is known to be usable.
+        from openai import OpenAI, AsyncOpenAI
         self.client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
+            base_url=OPENROUTER_BASE_URL,
             api_key=OPENROUTER_API_KEY,
         )
+        # Retries for async calls are handled by AIRequestScheduler, which knows about 429s.
+        self.async_client = AsyncOpenAI(
+            base_url=OPENROUTER_BASE_URL,
+            api_key=OPENROUTER_API_KEY,
+            max_retries=0,
+        )
+        self.cache = ResponseCache()
+        self._scheduler = None
+
+    @property
+    def scheduler(self):
+        """One scheduler per event loop, since its locks are bound to the loop that uses them."""
+        from ai_scheduler import AIRequestScheduler
+        loop = asyncio.get_running_loop()
+        if self._scheduler is None or self._scheduler[0] is not loop:
+            self._scheduler = (loop, AIRequestScheduler(self))
+        return self._scheduler[1]
+
+    def _request_params(self, messages, max_tokens):
+        return dict(
+            extra_headers={
+                "HTTP-Referer": OPENROUTER_SITE_URL,
+                "X-Title": OPENROUTER_SITE_NAME,
+            },
+            model=OPENROUTER_MODEL,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=0.7,
+        )
+
+    def _cache_key(self, params):
+        return self.cache.key(params['model'], params['messages'], {"max_tokens": params['max_tokens'], "temperature": params['temperature']})
 
-    def _make_request(self, messages, max_tokens=250):
+    def _make_request(self, messages, max_tokens=250, is_valid=None):
+        params = self._request_params(messages, max_tokens)
+        cache_key = self._cache_key(params)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
         try:
-            completion = self.client.chat.completions.create(
-                extra_headers={
-                    "HTTP-Referer": OPENROUTER_SITE_URL,
-                    "X-Title": OPENROUTER_SITE_NAME,
-                },
-                model=OPENROUTER_MODEL,
-                messages=messages,
-                max_tokens=max_tokens,
-                temperature=0.7,
-            )
-            return completion.choices[0].message.content.strip()
+            completion = self.client.chat.completions.create(**params)
+            response = completion.choices[0].message.content.strip()
+            if is_valid is None or is_valid(response):
+                self.cache.set(cache_key, response)
+            return response
         except Exception as e:
             print(f"Error calling AI model: {e}")
             return None
 
-    def generate_hook_and_revelation(self, article_text, style_prompt):
-        messages = [
+    async def _make_request_async(self, messages, max_tokens=250, is_valid=None):
+        return await self.scheduler.request(messages, max_tokens, is_valid)
+
+    def _hook_messages(self, article_text, style_prompt):
+        return [
             {"role": "system", "content": "You are a creative director for a tech-focused social media channel. Your goal is to create short, compelling video scripts from complex articles. Respond with only the Hook and the Revelation, separated by '|||'."},
             {"role": "user", "content": f"Article: \"{article_text[:2000]}\"\n\nStyle: \"{style_prompt}\"\n\nGenerate a very short, punchy Hook (max 10 words) and a detailed, easy-to-read Revelation (max 30 words) based on this style."}
         ]
-        response = self._make_request(messages)
+
+    def _parse_hook_response(self, response):
         if response and "|||" in response:
             parts = response.split("|||")
             hook = parts[0].replace("Hook:", "").strip().replace('"', '')
@@ -41,18 +81,91 @@ class AIProcessor:
             return hook, revelation
         return "Could not generate script.", "Please check the AI engine."
 
-    def generate_caption(self, hook, revelation, source_name, credit_info=None):
+    def _caption_messages(self, hook, revelation, source_name, credit_info):
         credit_line = f"\n\nCredits:\n{credit_info}" if credit_info else ""
-        messages = [
+        return [
             {"role": "system", "content": "You are a social media manager for 'NextGen Signals' crafting viral captions for Instagram Reels. Be engaging, add value, and encourage discussion."},
             {"role": "user", "content": f"Video Script:\nHook: {hook}\nRevelation: {revelation}\n\nSource: {source_name}\n\nWrite an engaging caption. Start with a strong opening, elaborate slightly on the revelation, and end with a question to boost comments. Add a 'Follow for more tech insights!' call to action.{credit_line}"}
         ]
-        return self._make_request(messages, max_tokens=150)
 
-    def generate_hashtags(self, topic):
-        messages = [
+    def _hashtag_messages(self, topic):
+        return [
             {"role": "system", "content": "You are a hashtag expert. Generate a list of 15 relevant hashtags for a tech and AI brand, mixing popular and niche tags. Return as a comma-separated list."},
             {"role": "user", "content": f"Topic: {topic}"}
         ]
-        response = self._make_request(messages, max_tokens=100)
+
+    def _parse_hashtags(self, response):
         return [f"#{tag.strip()}" for tag in response.split(",")] if response else []
+
+    def _package_messages(self, article_text, style_prompt, category, source_name):
+        return [
+            {"role": "system", "content": "You are the creative director and social media manager for 'NextGen Signals', a tech-focused social media channel. You turn complex articles into short, compelling Instagram Reels. Respond with a single JSON object and nothing else."},
+            {"role": "user", "content": f"Article: \"{article_text[:2000]}\"\n\nSource: {source_name}\nCategory: {category}\nStyle: \"{style_prompt}\"\n\n"
+                                        "Return a JSON object with these keys:\n"
+                                        "- \"hook\": a very short, punchy Hook (max 10 words) in this style.\n"
+                                        "- \"revelation\": a detailed, easy-to-read Revelation (max 30 words) in this style.\n"
+                                        "- \"caption\": an engaging caption for the reel. Start with a strong opening, elaborate slightly on the revelation, and end with a question to boost comments. Add a 'Follow for more tech insights!' call to action.\n"
+                                        "- \"hashtags\": a list of 15 relevant hashtags for a tech and AI brand, mixing popular and niche tags."}
+        ]
+
+    def _parse_package(self, response):
+        """Returns the parsed package, or None if the response isn't usable JSON with every field."""
+        if not response:
+            return None
+        match = re.search(r'\{.*\}', response, re.DOTALL)
+        try:
+            data = json.loads(match.group(0)) if match else None
+        except json.JSONDecodeError:
+            return None
+        if not isinstance(data, dict) or not all(data.get(key) for key in ("hook", "revelation", "caption", "hashtags")):
+            return None
+        hashtags = data['hashtags'] if isinstance(data['hashtags'], list) else str(data['hashtags']).replace(",", " ").split()
+        return {
+            "hook": str(data['hook']).strip().replace('"', ''),
+            "revelation": str(data['revelation']).strip().replace('"', ''),
+            "caption": str(data['caption']).strip(),
+            "hashtags": [f"#{str(tag).strip().lstrip('#')}" for tag in hashtags if str(tag).strip()]
+        }
+
+    def add_credits(self, caption, credit_info):
+        return f"{caption}\n\nCredits:\n{credit_info}" if caption and credit_info else caption
+
+    def generate_post_package(self, article_text, style_prompt, category, source_name):
+        """One structured call for hook, revelation, caption and hashtags. Returns None if the reply can't be parsed,
+        so callers can fall back to the per-call path."""
+        response = self._make_request(self._package_messages(article_text, style_prompt, category, source_name), max_tokens=600, is_valid=self._parse_package)
+        return self._parse_package(response)
+
+    def generate_hook_and_revelation(self, article_text, style_prompt):
+        response = self._make_request(self._hook_messages(article_text, style_prompt), is_valid=lambda r: "|||" in r)
+        return self._parse_hook_response(response)
+
+    def generate_caption(self, hook, revelation, source_name, credit_info=None):
+        return self._make_request(self._caption_messages(hook, revelation, source_name, credit_info), max_tokens=150)
+
+    def generate_hashtags(self, topic):
+        response = self._make_request(self._hashtag_messages(topic), max_tokens=100)
+        return self._parse_hashtags(response)
+
+    # --- Async variants used by the concurrent pipeline ---
+    async def generate_post_packages_async(self, items):
+        """Scripts for many articles at once, as fast as the rate limiter allows.
+        items: (article_text, style_prompt, category, source_name) tuples."""
+        packages = await self.scheduler.generate_post_packages(items)
+        print(f"   - AI scheduler: {self.scheduler.summary()}")
+        return packages
+
+    async def generate_post_package_async(self, article_text, style_prompt, category, source_name):
+        response = await self._make_request_async(self._package_messages(article_text, style_prompt, category, source_name), max_tokens=600, is_valid=self._parse_package)
+        return self._parse_package(response)
+
+    async def generate_hook_and_revelation_async(self, article_text, style_prompt):
+        response = await self._make_request_async(self._hook_messages(article_text, style_prompt), is_valid=lambda r: "|||" in r)
+        return self._parse_hook_response(response)
+
+    async def generate_caption_async(self, hook, revelation, source_name, credit_info=None):
+        return await self._make_request_async(self._caption_messages(hook, revelation, source_name, credit_info), max_tokens=150)
+
+    async def generate_hashtags_async(self, topic):
+        response = await self._make_request_async(self._hashtag_messages(topic), max_tokens=100)
+        return self._parse_hashtags(response)
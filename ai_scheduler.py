@@ -0,0 +1,140 @@
+# ai_scheduler.py
+# Async request scheduler for AIProcessor: token-bucket rate limiting, bounded concurrency,
+# jittered exponential backoff that honors Retry-After, and per-request accounting.
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+import openai
+from config import AI_REQUESTS_PER_MINUTE, AI_MAX_CONCURRENCY, AI_MAX_RETRIES
+import metrics
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+class TokenBucket:
+    def __init__(self, rate_per_second, capacity):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def block_for(self, seconds):
+        """Stops handing out tokens for `seconds` (used when the server says we are rate limited)."""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+def retry_after_seconds(error):
+    response = getattr(error, 'response', None)
+    value = response.headers.get('retry-after') if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except Exception:
+            return None
+
+class AIRequestScheduler:
+    def __init__(self, ai_processor, requests_per_minute=AI_REQUESTS_PER_MINUTE, max_concurrency=AI_MAX_CONCURRENCY,
+                 max_retries=AI_MAX_RETRIES, base_delay=1.0, max_delay=60.0):
+        self.ai = ai_processor
+        self.bucket = TokenBucket(requests_per_minute / 60.0, capacity=max(1, max_concurrency))
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.records = []
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _record(self, started, attempts, status, usage=None):
+        self.records.append({
+            "latency": time.monotonic() - started,
+            "attempts": attempts,
+            "status": status,
+            "prompt_tokens": getattr(usage, 'prompt_tokens', 0) or 0,
+            "completion_tokens": getattr(usage, 'completion_tokens', 0) or 0
+        })
+
+    async def request(self, messages, max_tokens=250, is_valid=None):
+        """Same contract as AIProcessor._make_request: the reply text, or None after retries are exhausted."""
+        params = self.ai._request_params(messages, max_tokens)
+        cache_key = self.ai._cache_key(params)
+        cached = self.ai.cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        started = time.monotonic()
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            try:
+                async with self.semaphore:
+                    completion = await self.ai.async_client.chat.completions.create(**params)
+            except (openai.APIConnectionError, openai.APITimeoutError, openai.APIStatusError) as e:
+                status = getattr(e, 'status_code', None)
+                if status is not None and status not in RETRYABLE_STATUS_CODES or attempt == self.max_retries:
+                    print(f"Error calling AI model: {e}")
+                    self._record(started, attempt + 1, status or "error")
+                    return None
+                delay = retry_after_seconds(e)
+                if status == 429:
+                    self.bucket.block_for(delay if delay is not None else self._backoff(attempt))
+                delay = delay if delay is not None else self._backoff(attempt)
+                print(f"   - AI request failed ({status or type(e).__name__}), retrying in {delay:.1f}s")
+                metrics.inc("retries_total", component="ai", status=status or type(e).__name__)
+                await asyncio.sleep(delay)
+                continue
+            except Exception as e:
+                print(f"Error calling AI model: {e}")
+                self._record(started, attempt + 1, "error")
+                return None
+
+            response = completion.choices[0].message.content.strip()
+            self._record(started, attempt + 1, "ok", getattr(completion, 'usage', None))
+            if is_valid is None or is_valid(response):
+                self.ai.cache.set(cache_key, response)
+            return response
+        return None
+
+    async def generate_post_packages(self, items):
+        """items: (article_text, style_prompt, category, source_name) tuples. Returns packages (or None) in order."""
+        async def one(item):
+            response = await self.request(self.ai._package_messages(*item), max_tokens=600, is_valid=self.ai._parse_package)
+            return self.ai._parse_package(response)
+        return await asyncio.gather(*(one(item) for item in items))
+
+    def summary(self):
+        ok = [r for r in self.records if r['status'] == "ok"]
+        latencies = sorted(r['latency'] for r in ok)
+        return {
+            "requests": len(self.records),
+            "succeeded": len(ok),
+            "retries": sum(r['attempts'] - 1 for r in self.records),
+            "prompt_tokens": sum(r['prompt_tokens'] for r in self.records),
+            "completion_tokens": sum(r['completion_tokens'] for r in self.records),
+            "p50_latency": latencies[len(latencies) // 2] if latencies else None,
+            "max_latency": latencies[-1] if latencies else None
+        }
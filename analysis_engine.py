@@ -1,9 +1,11 @@
 # analysis_engine.py
-import pandas as pd
 import os
 import json
 import random
-from config import ALL_POSTS_EXCEL_FILE, ANALYSIS_REPORT_FILE, OUTPUT_DIR_DATA
+from datetime import datetime, UTC
+from config import ALL_POSTS_EXCEL_FILE, ANALYSIS_REPORT_FILE, OUTPUT_DIR_DATA, ENGAGEMENT_WEIGHTS
+from post_store import PostStore
+from state_manager import STAT_DIMENSIONS
 
 def save_post_data(post_id, category, story_style, edit_style, hook, caption, hashtags):
     os.makedirs(OUTPUT_DIR_DATA, exist_ok=True)
@@ -16,7 +18,7 @@ def save_post_data(post_id, category, story_style, edit_style, hook, caption, ha
         "Hook": hook,
         "Caption": caption,
         "Hashtags": ' '.join(hashtags),
-        "Timestamp": pd.to_datetime("now", utc=True).isoformat(),
+        "Timestamp": datetime.now(UTC).isoformat(),
         # SIMULATED METRICS FOR ANALYSIS
         "Views": random.randint(5000, 25000),
         "Likes": random.randint(200, 2000),
@@ -25,28 +27,54 @@ def save_post_data(post_id, category, story_style, edit_style, hook, caption, ha
     }
 
     try:
-        df = pd.read_excel(ALL_POSTS_EXCEL_FILE) if os.path.exists(ALL_POSTS_EXCEL_FILE) else pd.DataFrame()
-        df_new = pd.DataFrame([new_post])
-        df = pd.concat([df, df_new], ignore_index=True)
-        df.to_excel(ALL_POSTS_EXCEL_FILE, index=False)
+        PostStore().append(new_post)
     except Exception as e:
-        print(f"Error saving to Excel: {e}")
+        print(f"Error saving post data: {e}")
+    return new_post
+
+def export_posts_to_excel(excel_file=ALL_POSTS_EXCEL_FILE):
+    """Writes the full post history to Excel for humans. The SQLite store stays the source of truth."""
+    os.makedirs(os.path.dirname(excel_file), exist_ok=True)
+    count = PostStore().export_excel(excel_file)
+    print(f"-> Exported {count} posts to {excel_file}")
+
+def _history_style_stats():
+    """Per-style count/sum/mean engagement over every stored post, or None if there is no history."""
+    df = PostStore().read_dataframe()
+    if df.empty:
+        return None
+    df['engagement_score'] = sum(df[field] * weight for field, weight in ENGAGEMENT_WEIGHTS.items())
+    style_stats = {}
+    for dimension, field in STAT_DIMENSIONS.items():
+        grouped = df.groupby(field)['engagement_score'].agg(['count', 'sum', 'mean'])
+        style_stats[dimension] = {key: {"count": int(row['count']), "sum": float(row['sum']), "ewma": float(row['mean'])} for key, row in grouped.iterrows()}
+    return style_stats
+
+def seed_style_stats_from_history(state_manager):
+    """Imports the existing post history into the running per-style stats the first time it is called.
+    The history already contains every recorded post, so the seeded stats replace the running ones."""
+    if state_manager.style_stats_seeded():
+        return
+    if state_manager.seed_style_stats(_history_style_stats):
+        print("-> Style stats seeded from the post history.")
 
 def run_weekly_analysis(state_manager):
+    # Independent of the analysis interval: the history must be in the running stats before they're used.
+    seed_style_stats_from_history(state_manager)
     if not state_manager.should_run_analysis():
         return
 
     print("📊 Running Weekly Performance Analysis...")
-    if not os.path.exists(ALL_POSTS_EXCEL_FILE):
+    df = PostStore().read_dataframe()
+    if df.empty:
         print("-> No post data to analyze.")
         return
 
-    df = pd.read_excel(ALL_POSTS_EXCEL_FILE)
     if len(df) < 5:
         print(f"-> Not enough data for analysis ({len(df)} posts). Needs at least 5.")
         return
 
-    df['engagement_score'] = (df['Likes'] * 0.2) + (df['Comments'] * 0.5) + (df['Shares'] * 0.3)
+    df['engagement_score'] = sum(df[field] * weight for field, weight in ENGAGEMENT_WEIGHTS.items())
     
     story_performance = df.groupby('Story_Style')['engagement_score'].mean().sort_values(ascending=False)
     edit_performance = df.groupby('Editing_Style')['engagement_score'].mean().sort_values(ascending=False)
@@ -0,0 +1,132 @@
+# article_pool.py
+import json
+import os
+import random
+import re
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from config import ARTICLE_POOL_FILE, ARTICLE_POOL_HISTORY, CONTENT_SOURCES
+from file_utils import file_lock, write_json
+
+# MinHash / LSH settings: 8 bands of 8 rows flags pairs above roughly 0.77 Jaccard similarity.
+NUM_BANDS = 8
+ROWS_PER_BAND = 8
+SHINGLE_SIZE = 3
+_MERSENNE_PRIME = (1 << 31) - 1
+_rng = np.random.RandomState(1337)
+_PERM_A = _rng.randint(1, _MERSENNE_PRIME, size=NUM_BANDS * ROWS_PER_BAND).astype(np.uint64)
+_PERM_B = _rng.randint(0, _MERSENNE_PRIME, size=NUM_BANDS * ROWS_PER_BAND).astype(np.uint64)
+
+def minhash_bands(text):
+    """Returns the LSH band keys of the MinHash signature of `text`'s word shingles."""
+    words = re.findall(r'\w+', re.sub('<.*?>', ' ', text or '').lower())
+    shingles = {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(max(1, len(words) - SHINGLE_SIZE + 1))}
+    hashes = np.fromiter((zlib.crc32(s.encode()) % _MERSENNE_PRIME for s in shingles), dtype=np.uint64, count=len(shingles))
+    signature = ((_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % _MERSENNE_PRIME).min(axis=1)
+    bands = signature.reshape(NUM_BANDS, ROWS_PER_BAND)
+    return [f"{i}:{zlib.crc32(band.tobytes()):08x}" for i, band in enumerate(bands)]
+
+class ArticlePool:
+    """Prefetched, deduplicated articles from every feed.
+
+    Fresh entries are kept in a per-category deque so picking one is O(1). Used links and
+    the LSH band keys of used articles are persisted so neither the same article nor a
+    syndicated near-copy of it is picked again. The used lists are shared by every process:
+    picks re-read them under an exclusive lock on `<pool_file>.lock` before adding to them.
+    """
+    def __init__(self, feed_cache, pool_file=ARTICLE_POOL_FILE):
+        self.feed_cache = feed_cache
+        self.pool_file = pool_file
+        self.fresh = {}
+        self.fetched_at = {} # category -> fetch time of the feed its deque was filled from
+        self._load()
+
+    def _locked(self):
+        return file_lock(f"{self.pool_file}.lock")
+
+    def _load(self):
+        """(Re)reads the used lists written by every process."""
+        self.used_links = deque(maxlen=ARTICLE_POOL_HISTORY)
+        self.used_bands = deque(maxlen=ARTICLE_POOL_HISTORY * NUM_BANDS)
+        if os.path.exists(self.pool_file):
+            try:
+                with open(self.pool_file, 'r') as f:
+                    data = json.load(f)
+                self.used_links.extend(data.get('used_links', []))
+                self.used_bands.extend(data.get('used_bands', []))
+            except Exception as e:
+                print(f"Error loading article pool index, starting fresh. Error: {e}")
+        self._used_link_set = set(self.used_links)
+        self._used_band_set = set(self.used_bands)
+
+    def _save(self):
+        write_json(self.pool_file, {"used_links": list(self.used_links), "used_bands": list(self.used_bands)})
+
+    def add_feed(self, category, feed):
+        entries = [dict(entry, source=feed['source'], category=category) for entry in feed['entries'] if entry.get('link') not in self._used_link_set]
+        random.shuffle(entries)
+        self.fresh[category] = deque(entries)
+        self.fetched_at[category] = feed.get('fetched_at', time.time())
+
+    def prefetch(self, sources=CONTENT_SOURCES, max_workers=8):
+        """Fetches every source concurrently (through the feed cache) into the pool."""
+        print(f"-> Prefetching {len(sources)} feeds...")
+
+        def fetch(item):
+            category, rss_url = item
+            try:
+                return category, self.feed_cache.get_feed(category, rss_url)
+            except Exception as e:
+                print(f"Error prefetching feed for {category}: {e}")
+                return category, None
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for category, feed in executor.map(fetch, sources.items()):
+                if feed:
+                    self.add_feed(category, feed)
+        print(f"   - Article pool ready: {sum(len(q) for q in self.fresh.values())} unused articles.")
+
+    def _is_duplicate(self, entry, bands):
+        if entry.get('link') in self._used_link_set:
+            return True
+        return any(band in self._used_band_set for band in bands)
+
+    def _append_used(self, entry, bands):
+        if len(self.used_links) == self.used_links.maxlen:
+            self._used_link_set.discard(self.used_links[0])
+        self.used_links.append(entry.get('link'))
+        self._used_link_set.add(entry.get('link'))
+        for band in bands:
+            if len(self.used_bands) == self.used_bands.maxlen:
+                self._used_band_set.discard(self.used_bands[0])
+            self.used_bands.append(band)
+            self._used_band_set.add(band)
+
+    def mark_used(self, entry, bands=None):
+        bands = bands or minhash_bands(f"{entry.get('title', '')} {entry.get('summary') or ''}")
+        with self._locked():
+            self._load()
+            self._append_used(entry, bands)
+            self._save()
+
+    def pick(self, category, max_age=None):
+        """Pops the next unused, non-duplicate entry for `category`, or None if the pool is dry
+        or, with `max_age`, if the feed it was filled from is older than `max_age` seconds."""
+        queue = self.fresh.get(category)
+        if not queue or (max_age is not None and time.time() - self.fetched_at.get(category, 0) >= max_age):
+            return None
+        with self._locked():
+            # Other processes may have used articles since this one last looked.
+            self._load()
+            while queue:
+                entry = queue.popleft()
+                bands = minhash_bands(f"{entry.get('title', '')} {entry.get('summary') or ''}")
+                if self._is_duplicate(entry, bands):
+                    continue
+                self._append_used(entry, bands)
+                self._save()
+                return entry
+        return None
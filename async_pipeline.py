@@ -0,0 +1,99 @@
+# async_pipeline.py
+# Concurrent variant of main.main(): independent network stages run at the same time
+# and each stage only waits on the data it actually needs.
+import asyncio
+import httpx
+from content_engine import ContentFetcher
+from ai_engine import AIProcessor
+from media_engine import MediaFetcher
+from analysis_engine import run_weekly_analysis
+from state_manager import StateManager
+from config import AI_COMBINED_MODE
+from main import build_job, media_credit_info, packaged_copy, save_post, render_post, publish_caption
+import metrics
+
+async def timed(stage, awaitable, **labels):
+    """Awaits `awaitable` inside a metrics span, so overlapping stages are each timed on their own."""
+    with metrics.span(stage, **labels):
+        return await awaitable
+
+async def prepare_post_async(plan, content_fetcher, ai_processor, media_fetcher, http_client):
+    """Async counterpart of main.prepare_post. Media sourcing overlaps the feed + script stages."""
+    category = plan['category']
+    search_query = f"abstract technology {category}"
+    video_task = asyncio.create_task(timed("media", media_fetcher.get_video_async(search_query, http_client), kind="video"))
+    music_task = asyncio.create_task(timed("media", media_fetcher.get_music_async(http_client), kind="music"))
+
+    article = await timed("fetch", content_fetcher.fetch_random_article_async(category, http_client), category=category)
+    if not article:
+        print("-> Could not fetch an article. Stopping run.")
+        video_task.cancel()
+        music_task.cancel()
+        return None
+
+    print("🧠 Generating script with AI...")
+    package = None
+    with metrics.span("ai", call="script"):
+        if AI_COMBINED_MODE:
+            package = await ai_processor.generate_post_package_async(article['summary'], plan['story_prompt'], category, article['source'])
+            if not package:
+                print("-> Combined AI response could not be parsed, falling back to separate calls.")
+        if package:
+            hook, revelation = package['hook'], package['revelation']
+        else:
+            hook, revelation = await ai_processor.generate_hook_and_revelation_async(article['summary'], plan['story_prompt'])
+    if not hook or not revelation:
+        print("-> AI failed to generate script. Stopping run.")
+        video_task.cancel()
+        music_task.cancel()
+        return None
+    print(f"   - Hook: {hook}\n   - Revelation: {revelation}")
+
+    video, music = await asyncio.gather(video_task, music_task)
+    return build_job(plan, article, package, hook, revelation, video, music)
+
+async def generate_copy_async(job, ai_processor):
+    """Caption and hashtags only depend on the script, so they are requested together."""
+    copy = packaged_copy(job, ai_processor)
+    if copy:
+        return copy
+    return await timed("ai", asyncio.gather(
+        ai_processor.generate_caption_async(job['hook'], job['revelation'], job['article']['source'], media_credit_info(job)),
+        ai_processor.generate_hashtags_async(f"{job['category']} {job['hook']}")
+    ), call="caption")
+
+async def main_async(publish=False):
+    print("🚀 Starting NextGen Signals AI Reel Engine v3.0 (async pipeline)...")
+
+    state_manager = StateManager()
+    content_fetcher = ContentFetcher()
+    ai_processor = AIProcessor()
+    media_fetcher = MediaFetcher()
+
+    run_weekly_analysis(state_manager)
+
+    plan = state_manager.reserve_next_slot()
+    print(f"🎬 Category: {plan['category']} | Story: '{plan['story_key']}' | Edit: '{plan['edit_key']}'")
+
+    async with httpx.AsyncClient() as http_client:
+        job = await prepare_post_async(plan, content_fetcher, ai_processor, media_fetcher, http_client)
+    if not job:
+        return
+
+    # Rendering is CPU-bound, so it runs in a thread while caption/hashtags are generated.
+    print("✍️ Rendering while caption and hashtags are finalized...")
+    render_task = asyncio.to_thread(render_post, job)
+    success, (caption, hashtags) = await asyncio.gather(render_task, generate_copy_async(job, ai_processor))
+    if not success:
+        print("-> Failed to create video file. Stopping run.")
+        metrics.inc("posts_total", status="failed")
+        return
+
+    post = save_post(job, caption, hashtags, state_manager)
+
+    if publish:
+        from publishing_engine import Publisher
+        print("📤 Publishing reel...")
+        with Publisher() as publisher:
+            await asyncio.wrap_future(publisher.submit(job['output_video_path'], job['post_id'], publish_caption(post)))
+    print("\n✨ Process complete. Ready for next run.")
@@ -0,0 +1,159 @@
+# audio_library.py
+# Index of music tracks with precomputed duration, loudness and candidate segment offsets,
+# so a render only decodes the window it actually uses (via ffmpeg -ss in the encoder).
+# Usage: python audio_library.py [build|stats]
+import json
+import os
+import random
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from config import AUDIO_INDEX_FILE, MUSIC_TARGET_LOUDNESS_DB, REEL_DURATION_SECONDS
+from encoder import get_ffmpeg_exe
+from file_utils import write_json
+import metrics
+
+ANALYSIS_SAMPLE_RATE = 8000 # Plenty for loudness/energy, and cheap to decode
+CANDIDATE_SEGMENTS = 5
+
+class AudioLibrary:
+    def __init__(self, index_file=AUDIO_INDEX_FILE):
+        self.index_file = index_file
+        self.index = {"folders": {}, "tracks": {}}
+        if os.path.exists(index_file):
+            try:
+                with open(index_file, 'r') as f:
+                    self.index.update(json.load(f))
+            except Exception as e:
+                print(f"Error loading audio index, rebuilding. Error: {e}")
+
+    def _save(self):
+        write_json(self.index_file, self.index, indent=2)
+
+    def list_tracks(self, folder="audio"):
+        """Track filenames in `folder`; the directory is only re-listed when its mtime changes."""
+        mtime = os.stat(folder).st_mtime
+        cached = self.index['folders'].get(folder)
+        if cached and cached['mtime'] == mtime:
+            return cached['files']
+        files = sorted(f for f in os.listdir(folder) if f.endswith((".mp3", ".wav")))
+        self.index['folders'][folder] = {"mtime": mtime, "files": files}
+        self._save()
+        return files
+
+    def _decode_mono(self, path):
+        cmd = [get_ffmpeg_exe(), "-loglevel", "error", "-i", path, "-vn", "-ac", "1", "-ar", str(ANALYSIS_SAMPLE_RATE), "-f", "f32le", "-"]
+        return np.frombuffer(subprocess.run(cmd, check=True, capture_output=True).stdout, dtype=np.float32)
+
+    def _probe_sample_rate(self, path):
+        try:
+            from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+            return ffmpeg_parse_infos(path).get('audio_fps')
+        except Exception:
+            return None
+
+    def analyze(self, path, segment_duration=REEL_DURATION_SECONDS, save=True):
+        """Decodes the track once at low rate and stores duration, loudness, gain and the best segment offsets."""
+        samples = self._decode_mono(path)
+        duration = len(samples) / ANALYSIS_SAMPLE_RATE
+        rms = float(np.sqrt(np.mean(np.square(samples, dtype=np.float64)))) if len(samples) else 0.0
+        loudness_db = 20 * np.log10(rms) if rms > 0 else -90.0
+        gain = float(np.clip(10 ** ((MUSIC_TARGET_LOUDNESS_DB - loudness_db) / 20), 0.05, 2.0))
+
+        # Energy per second, then the mean energy of every segment-long window (1 s stride).
+        seconds = int(duration)
+        per_second = np.square(samples[:seconds * ANALYSIS_SAMPLE_RATE].reshape(seconds, ANALYSIS_SAMPLE_RATE)).mean(axis=1) if seconds else np.zeros(0)
+        window = int(segment_duration)
+        offsets = [0.0]
+        if seconds > window:
+            window_energy = np.convolve(per_second, np.ones(window) / window, mode='valid')
+            # Keep the strongest few windows that don't mostly overlap, skipping near-silent ones.
+            offsets = []
+            for offset in np.argsort(window_energy)[::-1]:
+                if len(offsets) == CANDIDATE_SEGMENTS or window_energy[offset] < 0.1 * window_energy.max():
+                    break
+                if all(abs(offset - chosen) >= window / 2 for chosen in offsets):
+                    offsets.append(float(offset))
+            offsets = offsets or [0.0]
+
+        stat = os.stat(path)
+        entry = {
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "duration": duration,
+            "sample_rate": self._probe_sample_rate(path),
+            "loudness_db": float(loudness_db),
+            "gain": gain,
+            "segment_duration": segment_duration,
+            "segment_offsets": offsets
+        }
+        self.index['tracks'][path] = entry
+        if save:
+            self._save()
+        return entry
+
+    def _is_stale(self, path, segment_duration=REEL_DURATION_SECONDS):
+        entry = self.index['tracks'].get(path)
+        stat = os.stat(path)
+        return not entry or entry['mtime'] != stat.st_mtime or entry['size'] != stat.st_size or entry['segment_duration'] != segment_duration
+
+    def known_tracks(self, folder="audio"):
+        """Every track a render can pick: the local folder plus Jamendo downloads in the media cache."""
+        from media_cache import MediaCache
+        paths = [os.path.join(folder, f) for f in self.list_tracks(folder)] if os.path.isdir(folder) else []
+        return paths + [entry['path'] for entry in MediaCache().find("jamendo_")]
+
+    def unindexed_tracks(self, folder="audio", segment_duration=REEL_DURATION_SECONDS):
+        return [path for path in self.known_tracks(folder) if self._is_stale(path, segment_duration)]
+
+    def build(self, folder="audio", segment_duration=REEL_DURATION_SECONDS, workers=4, verbose=True):
+        """Analyzes every known track that isn't indexed yet, a few ffmpeg decodes at a time, and saves the index once.
+        Run offline (or at worker start-up) so renders never pay for a full decode. Returns the number analyzed."""
+        paths = self.unindexed_tracks(folder, segment_duration)
+        if not paths:
+            if verbose:
+                print(f"-> Audio index up to date ({len(self.index['tracks'])} tracks).")
+            return 0
+        if verbose:
+            print(f"-> Analyzing {len(paths)} music track(s)...")
+
+        def analyze(path):
+            try:
+                self.analyze(path, segment_duration, save=False)
+                return True
+            except Exception as e:
+                print(f"   - Could not analyze {path}: {e}")
+                return False
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            analyzed = sum(executor.map(analyze, paths))
+        self._save()
+        if verbose:
+            print(f"-> Audio index built: {analyzed} track(s) analyzed.")
+        return analyzed
+
+    def get_track(self, path, segment_duration=REEL_DURATION_SECONDS):
+        entry = self.index['tracks'].get(path)
+        stale = self._is_stale(path, segment_duration)
+        metrics.cache_lookup("audio_analysis", not stale)
+        if stale:
+            print(f"   - Analyzing music track: {os.path.basename(path)}")
+            entry = self.analyze(path, segment_duration)
+        return entry
+
+    def pick_segment(self, path, duration):
+        """Returns (start offset, gain) for a `duration`-long window of the track."""
+        entry = self.get_track(path)
+        max_start = max(0.0, entry['duration'] - duration)
+        offsets = [o for o in entry['segment_offsets'] if o <= max_start]
+        start = random.choice(offsets) if offsets and duration <= entry['segment_duration'] else random.uniform(0, max_start)
+        return start, entry['gain']
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    library = AudioLibrary()
+    if command == "build":
+        library.build()
+    else:
+        print(f"-> {len(library.index['tracks'])} tracks indexed, {len(library.unindexed_tracks())} not indexed yet.")
@@ -0,0 +1,301 @@
+# benchmarks/run_benchmarks.py
+# Offline benchmarks for startup (import + preflight time), the render path (video_engine) and
+# the data path (post store + analysis).
+# Everything runs against synthetic media and post histories in a temporary workspace, so no
+# Pexels/Jamendo/OpenRouter access is needed. Each case runs in a fresh process so its peak RSS
+# and cold caches are its own.
+#
+# No baseline is committed: timings only compare on the same machine. Save one first, then compare:
+#
+#   python benchmarks/run_benchmarks.py --save-baseline      # run and store the results in benchmarks/baseline.json
+#   python benchmarks/run_benchmarks.py                      # run and compare against it (exit 1 on regression)
+#   python benchmarks/run_benchmarks.py --require-baseline   # same, but a missing baseline is an error (exit 2), for CI
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, UTC
+from multiprocessing import get_context
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+BENCH_DIR = os.path.join(REPO_ROOT, "benchmarks")
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+DEFAULT_OUTPUT = os.path.join(BENCH_DIR, "results", "latest.json")
+
+# Metric name suffix -> whether a larger value is better.
+METRIC_DIRECTIONS = {"_seconds": False, "_fps": True, "_rss_mb": False}
+
+# Modules whose import cost is tracked; `main` must stay cheap since cron runs import it first.
+STARTUP_MODULES = ["main", "video_engine", "ai_engine", "analysis_engine", "content_engine", "media_engine"]
+
+HOOK = "The future is here now"
+REVELATION = "Tiny robots are rewriting how factories build everything we use daily"
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # KiB on Linux
+
+def prepare_workspace(path):
+    """A case directory: the repo's relative paths (output/, temp_media/, fonts/, assets/) all resolve inside it."""
+    os.makedirs(path, exist_ok=True)
+    for name in ("fonts", "assets"):
+        link = os.path.join(path, name)
+        if not os.path.exists(link):
+            os.symlink(os.path.join(REPO_ROOT, name), link)
+    os.chdir(path)
+
+def generate_media(workspace, duration):
+    """Synthetic 1920x1080 source footage and a music track, made with ffmpeg's lavfi sources."""
+    from encoder import get_ffmpeg_exe
+    video_path = os.path.join(workspace, "source.mp4")
+    music_path = os.path.join(workspace, "music.mp3")
+    ffmpeg = get_ffmpeg_exe()
+    subprocess.run([ffmpeg, "-y", "-loglevel", "error", "-f", "lavfi", "-i", f"testsrc2=size=1920x1080:rate=30:duration={duration + 1}",
+                    "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", video_path], check=True)
+    # A tone with a slow swell, so the music analysis has louder and quieter windows to choose from.
+    subprocess.run([ffmpeg, "-y", "-loglevel", "error", "-f", "lavfi", "-i", "aevalsrc='0.5*sin(2*PI*220*t)*(0.5+0.5*sin(2*PI*t/20))':s=44100:d=60",
+                    "-c:a", "libmp3lame", "-b:a", "128k", music_path], check=True)
+    return video_path, music_path
+
+def synthetic_posts(count, start_index=0):
+    from config import CONTENT_SOURCES, STORYTELLING_STYLES, EDITING_STYLES
+    rng = random.Random(start_index)
+    now = datetime.now(UTC)
+    for i in range(start_index, start_index + count):
+        yield {
+            "Post_ID": f"bench_{i}",
+            "Category": rng.choice(list(CONTENT_SOURCES)),
+            "Story_Style": rng.choice(list(STORYTELLING_STYLES)),
+            "Editing_Style": rng.choice(list(EDITING_STYLES)),
+            "Hook": HOOK,
+            "Caption": REVELATION,
+            "Hashtags": "#ai #tech",
+            "Timestamp": (now - timedelta(minutes=i)).isoformat(),
+            "Views": rng.randint(5000, 25000),
+            "Likes": rng.randint(200, 2000),
+            "Comments": rng.randint(20, 150),
+            "Shares": rng.randint(10, 100),
+        }
+
+def bench_render(case_dir, style_key, video_path, music_path, duration):
+    prepare_workspace(case_dir)
+    import video_engine
+    from config import EDITING_STYLES
+    from audio_library import AudioLibrary
+    from source_cache import normalize_source
+    video_engine.REEL_DURATION_SECONDS = duration
+    style_params = EDITING_STYLES[style_key]
+    result = {}
+
+    started = time.perf_counter()
+    AudioLibrary().get_track(music_path)
+    result['audio_analysis_seconds'] = time.perf_counter() - started
+
+    from motion_analysis import analyze
+    started = time.perf_counter()
+    analyze(video_path, "bench_source")
+    result['motion_analysis_seconds'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    normalize_source(video_path, video_engine.reel_size(), duration)
+    result['normalize_seconds'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    video_clip, final_video = video_engine.build_reel_clip(video_path, HOOK, REVELATION, style_params)
+    result['layout_seconds'] = time.perf_counter() - started
+
+    # Decode + composite only, without the encoder.
+    fps = video_clip.fps or 30
+    started = time.perf_counter()
+    frames = sum(1 for _ in final_video.iter_frames(fps=fps, dtype='uint8'))
+    result['compose_seconds'] = time.perf_counter() - started
+    result['compose_fps'] = frames / result['compose_seconds']
+    video_clip.close()
+
+    # End to end, with the caches above warm: decode, composite, encode and mux.
+    started = time.perf_counter()
+    if not video_engine.create_reel(video_path, music_path, HOOK, REVELATION, os.path.join(case_dir, "reel.mp4"), style_params):
+        raise RuntimeError(f"create_reel failed for {style_key}")
+    result['create_reel_seconds'] = time.perf_counter() - started
+    result['create_reel_fps'] = frames / result['create_reel_seconds']
+
+    # Every OUTPUT_VARIANTS entry from one composite pass.
+    from config import OUTPUT_VARIANTS
+    started = time.perf_counter()
+    output_paths = video_engine.variant_paths(os.path.join(case_dir, "variants.mp4"), list(OUTPUT_VARIANTS))
+    if not video_engine.create_reel_variants(video_path, music_path, HOOK, REVELATION, output_paths, style_params):
+        raise RuntimeError(f"create_reel_variants failed for {style_key}")
+    result['all_variants_seconds'] = time.perf_counter() - started
+    result['frames'] = frames
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+def bench_data(case_dir, history_size, appends=50):
+    prepare_workspace(case_dir)
+    from post_store import PostStore
+    from analysis_engine import save_post_data
+    from state_manager import StateManager
+    result = {}
+
+    started = time.perf_counter()
+    PostStore()._insert_many(tuple(post.values()) for post in synthetic_posts(history_size))
+    result['seed_history_seconds'] = time.perf_counter() - started
+
+    state_manager = StateManager()
+    started = time.perf_counter()
+    for post in synthetic_posts(appends, start_index=history_size):
+        saved = save_post_data(post['Post_ID'], post['Category'], post['Story_Style'], post['Editing_Style'], post['Hook'], post['Caption'], post['Hashtags'].split())
+        state_manager.record_post_metrics(saved)
+    result['save_post_seconds'] = (time.perf_counter() - started) / appends
+
+    from analysis_engine import run_weekly_analysis
+    # Force both the history import and the analysis itself; the state file is re-read under the lock.
+    with state_manager._transaction() as state:
+        state['last_analysis_timestamp'] = None
+        state['style_stats_seeded'] = False
+    started = time.perf_counter()
+    run_weekly_analysis(state_manager)
+    result['weekly_analysis_seconds'] = time.perf_counter() - started
+    result['posts'] = PostStore().count()
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+def bench_startup(case_dir, repeats=3):
+    """Import time of the pipeline modules and the wall time of `main.py --preflight`, each in a fresh interpreter."""
+    prepare_workspace(case_dir)
+    link = os.path.join(case_dir, "audio")
+    if not os.path.exists(link):
+        os.symlink(os.path.join(REPO_ROOT, "audio"), link)
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    result = {}
+    for module in STARTUP_MODULES:
+        code = f"import time; started = time.perf_counter(); import {module}; print(time.perf_counter() - started)"
+        result[f"import_{module}_seconds"] = min(
+            float(subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True, env=env).stdout.split()[-1])
+            for _ in range(repeats))
+
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        # The exit code depends on the local keys; only the time matters here.
+        subprocess.run([sys.executable, os.path.join(REPO_ROOT, "main.py"), "--preflight"], capture_output=True, env=env)
+        timings.append(time.perf_counter() - started)
+    result['preflight_seconds'] = min(timings)
+    return result
+
+def run_case(function, *args):
+    """Runs one case in a fresh spawned process and returns its result dict."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(function, *args).result()
+
+def compare(results, baseline, threshold):
+    """Returns (regressions, unmatched): (case, metric, baseline, current, change) for every metric that got worse
+    by more than `threshold`, and the "case metric" names that have no baseline value to compare with."""
+    regressions, unmatched = [], []
+    for case, metrics in results.items():
+        for metric, value in metrics.items():
+            higher_is_better = next((better for suffix, better in METRIC_DIRECTIONS.items() if metric.endswith(suffix)), None)
+            if higher_is_better is None:
+                continue
+            previous = baseline.get(case, {}).get(metric)
+            if not previous:
+                unmatched.append(f"{case} {metric}")
+                continue
+            change = (value - previous) / previous
+            if (-change if higher_is_better else change) > threshold:
+                regressions.append((case, metric, previous, value, change))
+    return regressions, unmatched
+
+def main():
+    from config import EDITING_STYLES
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the reel renderer and the post data path.",
+                                     epilog="Regressions are only detected against a baseline saved on the same machine: "
+                                            "run once with --save-baseline, then without it.")
+    parser.add_argument("--styles", nargs="+", default=list(EDITING_STYLES), help="Editing styles to render.")
+    parser.add_argument("--history-sizes", nargs="+", type=int, default=[100, 1000, 10000], help="Synthetic post history sizes.")
+    parser.add_argument("--duration", type=float, default=4.0, help="Reel duration in seconds for render cases.")
+    parser.add_argument("--skip-render", action="store_true", help="Skip the render cases.")
+    parser.add_argument("--skip-data", action="store_true", help="Skip the data path cases.")
+    parser.add_argument("--skip-startup", action="store_true", help="Skip the import time and preflight cases.")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Where to write the JSON results.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON to compare against.")
+    parser.add_argument("--save-baseline", "--update-baseline", dest="save_baseline", action="store_true", help="Store this run as the new baseline.")
+    parser.add_argument("--require-baseline", action="store_true", help="Fail (exit 2) instead of warning when there is no baseline.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative slowdown that counts as a regression.")
+    parser.add_argument("--keep-workspace", action="store_true", help="Don't delete the temporary workspace.")
+    args = parser.parse_args()
+
+    workspace = tempfile.mkdtemp(prefix="reel_bench_")
+    results = {}
+    try:
+        if not args.skip_startup:
+            print("-> Measuring import and preflight time...")
+            results["startup"] = run_case(bench_startup, os.path.join(workspace, "startup"))
+        if not args.skip_render:
+            print("🎞️ Generating synthetic media...")
+            video_path, music_path = generate_media(workspace, args.duration)
+            for style_key in args.styles:
+                print(f"-> Rendering '{style_key}'...")
+                results[f"render/{style_key}"] = run_case(bench_render, os.path.join(workspace, f"render_{style_key}"), style_key, video_path, music_path, args.duration)
+        if not args.skip_data:
+            for history_size in args.history_sizes:
+                print(f"-> Data path with {history_size} posts...")
+                results[f"data/history_{history_size}"] = run_case(bench_data, os.path.join(workspace, f"data_{history_size}"), history_size)
+    finally:
+        if args.keep_workspace:
+            print(f"-> Workspace kept at {workspace}")
+        else:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(UTC).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "duration": args.duration
+        },
+        "results": results
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"\n📊 Results written to {args.output}")
+    for case, metrics in results.items():
+        print(f"   {case}: " + ", ".join(f"{name}={value:.4g}" for name, value in metrics.items()))
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=4)
+        print(f"-> Baseline saved: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\n⚠️ WARNING: no baseline at {args.baseline}, so NO regression check was done.", file=sys.stderr)
+        print("   Save one on this machine with: python benchmarks/run_benchmarks.py --save-baseline", file=sys.stderr)
+        return 2 if args.require_baseline else 0
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)['results']
+    regressions, unmatched = compare(results, baseline, args.threshold)
+    if unmatched:
+        print(f"⚠️ {len(unmatched)} metric(s) have no baseline value and were not checked: {', '.join(unmatched)}", file=sys.stderr)
+        print("   Re-run with --save-baseline to include them.", file=sys.stderr)
+    if not regressions:
+        print(f"✅ No regressions beyond {args.threshold:.0%} against {args.baseline}")
+        return 0
+    print(f"⚠️ {len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+    for case, metric, previous, value, change in regressions:
+        print(f"   - {case} {metric}: {previous:.4g} -> {value:.4g} ({change:+.0%})")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
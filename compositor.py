@@ -0,0 +1,134 @@
+# compositor.py
+# Timeline compositor for the reel styles. Layers are indexed by frame so each frame only
+# touches the layers that are visible at that time, and blending reuses preallocated buffers.
+import math
+import time
+import numpy as np
+
+# Opt-in per-frame profiling: called as hook(t, active_layer_count, seconds) after every compose().
+_frame_hook = None
+
+def set_frame_hook(hook):
+    global _frame_hook
+    _frame_hook = hook
+
+class Layer:
+    """A static premultiplied RGBA image shown over [start, end) with linear alpha fades."""
+    def __init__(self, rgb, alpha, x, y, start, end, fade_in=0.0, fade_out=0.0):
+        self.rgb = rgb        # float32 (h, w, 3), premultiplied, 0-255
+        self.alpha = alpha    # float32 (h, w, 1), 0-1
+        self.x, self.y = x, y
+        self.start, self.end = start, end
+        self.fade_in, self.fade_out = fade_in, fade_out
+
+    def opacity(self, t):
+        factor = 1.0
+        if self.fade_in > 0:
+            factor = min(factor, (t - self.start) / self.fade_in)
+        if self.fade_out > 0:
+            factor = min(factor, (self.end - t) / self.fade_out)
+        return max(0.0, min(1.0, factor))
+
+class TimelineCompositor:
+    def __init__(self, size, duration, fps, background_dim=0.0):
+        self.width, self.height = size
+        self.duration = duration
+        self.fps = fps
+        self.background_dim = background_dim
+        self.layers = []
+        self._index = None
+        self._canvas = np.empty((self.height, self.width, 3), dtype=np.float32)
+        self._scratch_rgb = np.empty((self.height, self.width, 3), dtype=np.float32)
+        self._scratch_alpha = np.empty((self.height, self.width, 1), dtype=np.float32)
+        self._frame = np.empty((self.height, self.width, 3), dtype=np.uint8)
+
+    def add_layer(self, rgba, x, y, start=0.0, end=None, fade_in=0.0, fade_out=0.0, premultiplied=False):
+        """Adds an RGBA image (uint8, or float32 premultiplied 0-1 when premultiplied=True).
+
+        The layer is clipped to the frame and trimmed to the bounding box of its visible pixels.
+        """
+        if premultiplied:
+            rgb, alpha = rgba[..., :3] * 255.0, rgba[..., 3:]
+        else:
+            alpha = rgba[..., 3:].astype(np.float32) / 255.0
+            rgb = rgba[..., :3].astype(np.float32) * alpha
+
+        h, w = alpha.shape[:2]
+        x0, y0 = max(int(x), 0), max(int(y), 0)
+        x1, y1 = min(int(x) + w, self.width), min(int(y) + h, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return None
+        alpha = alpha[y0 - int(y):y1 - int(y), x0 - int(x):x1 - int(x)]
+        rgb = rgb[y0 - int(y):y1 - int(y), x0 - int(x):x1 - int(x)]
+
+        rows = np.flatnonzero(alpha[..., 0].any(axis=1))
+        cols = np.flatnonzero(alpha[..., 0].any(axis=0))
+        if not len(rows):
+            return None
+        r0, r1, c0, c1 = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+        layer = Layer(np.ascontiguousarray(rgb[r0:r1, c0:c1], dtype=np.float32),
+                      np.ascontiguousarray(alpha[r0:r1, c0:c1], dtype=np.float32),
+                      x0 + c0, y0 + r0, start, self.duration if end is None else end, fade_in, fade_out)
+        self.layers.append(layer)
+        self._index = None
+        return layer
+
+    def _build_index(self):
+        """Buckets layers by output frame number: frame -> layers overlapping that frame."""
+        frame_count = int(math.ceil(self.duration * self.fps)) + 1
+        self._index = [[] for _ in range(frame_count)]
+        for layer in self.layers:
+            first = max(0, int(math.floor(layer.start * self.fps)))
+            last = min(frame_count - 1, int(math.ceil(layer.end * self.fps)))
+            for frame_number in range(first, last + 1):
+                self._index[frame_number].append(layer)
+
+    def active_layers(self, t):
+        if self._index is None:
+            self._build_index()
+        frame_number = min(max(int(t * self.fps), 0), len(self._index) - 1)
+        return [layer for layer in self._index[frame_number] if layer.start <= t < layer.end]
+
+    def compose(self, background, t):
+        """Blends the active layers over `background` (uint8 HxWx3).
+
+        The returned array is an internal buffer that is overwritten by the next call.
+        """
+        if _frame_hook is None:
+            return self._compose(background, t)
+        started = time.perf_counter()
+        frame = self._compose(background, t)
+        _frame_hook(t, len(self.active_layers(t)), time.perf_counter() - started)
+        return frame
+
+    def _compose(self, background, t):
+        layers = self.active_layers(t)
+        if not layers and not self.background_dim:
+            return background
+
+        canvas = self._canvas
+        np.copyto(canvas, background, casting='unsafe')
+        if self.background_dim:
+            canvas *= 1.0 - self.background_dim
+
+        for layer in layers:
+            factor = layer.opacity(t)
+            if factor <= 0:
+                continue
+            h, w = layer.alpha.shape[:2]
+            region = canvas[layer.y:layer.y + h, layer.x:layer.x + w]
+            scratch_alpha = self._scratch_alpha[:h, :w]
+            scratch_rgb = self._scratch_rgb[:h, :w]
+            # region = region * (1 - factor * alpha) + factor * rgb, without temporaries
+            np.multiply(layer.alpha, factor, out=scratch_alpha)
+            np.multiply(region, scratch_alpha, out=scratch_rgb)
+            region -= scratch_rgb
+            np.multiply(layer.rgb, factor, out=scratch_rgb)
+            region += scratch_rgb
+
+        np.copyto(self._frame, canvas, casting='unsafe')
+        return self._frame
+
+    def apply_to(self, video_clip):
+        """Returns `video_clip` with the timeline composited onto every frame."""
+        return video_clip.fl(lambda get_frame, t: self.compose(get_frame(t), t))
@@ -8,8 +8,13 @@ load_dotenv()
 # --- API Keys & Credentials (Loaded securely from environment) ---
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 OPENROUTER_MODEL = "deepseek/deepseek-chat-v3-0324:free"
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1") # Point at a local mock server for testing
 OPENROUTER_SITE_URL = os.getenv("OPENROUTER_SITE_URL", "https://nextgensignals.ai")
 OPENROUTER_SITE_NAME = os.getenv("OPENROUTER_SITE_NAME", "NextGen Signals")
+AI_COMBINED_MODE = os.getenv("AI_COMBINED_MODE", "1") == "1" # One JSON call for hook, revelation, caption and hashtags
+AI_REQUESTS_PER_MINUTE = int(os.getenv("AI_REQUESTS_PER_MINUTE", 20)) # OpenRouter free-tier limit
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", 4))
+AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", 5))
 
 PEXELS_API_KEY = os.getenv("PEXELS_API_KEY")
 JAMENDO_CLIENT_ID = os.getenv("JAMENDO_CLIENT_ID", "735d6963")
@@ -17,9 +22,19 @@ JAMENDO_CLIENT_ID = os.getenv("JAMENDO_CLIENT_ID", "735d6963")
 CLOUDINARY_CLOUD_NAME = os.getenv("CLOUDINARY_CLOUD_NAME")
 CLOUDINARY_API_KEY = os.getenv("CLOUDINARY_API_KEY")
 CLOUDINARY_API_SECRET = os.getenv("CLOUDINARY_API_SECRET")
+CLOUDINARY_API_BASE_URL = os.getenv("CLOUDINARY_API_BASE_URL", "https://api.cloudinary.com/v1_1") # Point at a local stand-in for testing
 
 FB_PAGE_ACCESS_TOKEN = os.getenv("FB_PAGE_ACCESS_TOKEN")
 INSTAGRAM_BUSINESS_ACCOUNT_ID = os.getenv("INSTAGRAM_BUSINESS_ACCOUNT_ID")
+INSTAGRAM_GRAPH_URL = os.getenv("INSTAGRAM_GRAPH_URL", "https://graph.facebook.com/v19.0")
+
+# --- Publishing ---
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 20 * 1024 * 1024)) # Cloudinary needs at least 5 MB per chunk except the last
+UPLOAD_MAX_ATTEMPTS = 4 # Per chunk
+PUBLISH_MAX_UPLOADS = 2 # Reels uploaded at the same time
+PUBLISH_POLL_INITIAL_SECONDS = 3
+PUBLISH_POLL_MAX_SECONDS = 30
+PUBLISH_TIMEOUT_SECONDS = 10 * 60 # Give up on a container that isn't ready by then
 
 # --- Content Strategy ---
 CONTENT_SOURCES = {
@@ -73,17 +88,118 @@ EDITING_STYLES = {
     }
 }
 
+# --- Encoding Profiles (see encoder.FFmpegEncoder) ---
+ENCODING_PROFILES = {
+    "fast": {
+        "codec": "libx264",
+        "preset": "veryfast",
+        "crf": 25,
+        "pix_fmt": "yuv420p",
+        "threads": 0, # 0 lets ffmpeg pick based on available cores
+        "audio_codec": "aac",
+        "audio_bitrate": "128k"
+    },
+    "balanced": {
+        "codec": "libx264",
+        "preset": "medium",
+        "crf": 21,
+        "pix_fmt": "yuv420p",
+        "threads": 0,
+        "audio_codec": "aac",
+        "audio_bitrate": "160k"
+    },
+    "archival": {
+        "codec": "libx264",
+        "preset": "slow",
+        "crf": 16,
+        "pix_fmt": "yuv420p",
+        "threads": 0,
+        "audio_codec": "aac",
+        "audio_bitrate": "256k"
+    },
+    "preview": {
+        "codec": "libx264",
+        "preset": "ultrafast",
+        "crf": 30,
+        "pix_fmt": "yuv420p",
+        "threads": 0,
+        "audio_codec": "aac",
+        "audio_bitrate": "96k"
+    }
+}
+DEFAULT_ENCODING_PROFILE = os.getenv("ENCODING_PROFILE", "balanced")
+if DEFAULT_ENCODING_PROFILE not in ENCODING_PROFILES:
+    raise ValueError(f"ENCODING_PROFILE={DEFAULT_ENCODING_PROFILE!r} must be one of: {', '.join(ENCODING_PROFILES)}")
+
 # --- Video & Asset Configuration ---
 REEL_WIDTH = 1080
 REEL_HEIGHT = 1920
 REEL_DURATION_SECONDS = 12
 LOGO_PATH = "assets/NextGen_Signals_Logo.png"
 LOGO_WIDTH = 280
+MUSIC_TARGET_LOUDNESS_DB = -24.0 # RMS dBFS the background music is normalized to
+PREVIEW_SCALE = float(os.getenv("PREVIEW_SCALE", "0.5")) # Preview renders are REEL_WIDTH x REEL_HEIGHT scaled by this
+PREVIEW_FPS = 15
+
+# One render pass can feed several encoders. Each variant center-crops the composited
+# REEL_WIDTH x REEL_HEIGHT frame to its own aspect ratio and scales it, inside ffmpeg.
+OUTPUT_VARIANTS = {
+    "reel_1080": {"width": REEL_WIDTH, "height": REEL_HEIGHT, "profile": DEFAULT_ENCODING_PROFILE},
+    "reel_720": {"width": 720, "height": 1280, "profile": "fast"},
+    "feed_4x5": {"width": 1080, "height": 1350, "profile": DEFAULT_ENCODING_PROFILE},
+    "square": {"width": 1080, "height": 1080, "profile": DEFAULT_ENCODING_PROFILE},
+    "preview": {"width": 360, "height": 640, "profile": "preview"},
+}
+DEFAULT_RENDER_VARIANT = "reel_1080"
+RENDER_VARIANTS = [name.strip() for name in os.getenv("RENDER_VARIANTS", DEFAULT_RENDER_VARIANT).split(",") if name.strip()] # The first one is the post's main video
+if not RENDER_VARIANTS or set(RENDER_VARIANTS) - set(OUTPUT_VARIANTS):
+    raise ValueError(f"RENDER_VARIANTS={RENDER_VARIANTS} must name one or more of: {', '.join(OUTPUT_VARIANTS)}")
 
 # --- Output & State Management ---
 OUTPUT_DIR_VIDEO = "output/videos"
 OUTPUT_DIR_DATA = "output/data"
-ALL_POSTS_EXCEL_FILE = os.path.join(OUTPUT_DIR_DATA, "all_posts.xlsx")
+POSTS_DB_FILE = os.path.join(OUTPUT_DIR_DATA, "posts.sqlite3")
+ALL_POSTS_EXCEL_FILE = os.path.join(OUTPUT_DIR_DATA, "all_posts.xlsx") # Export only, see export_posts_to_excel
 STATE_FILE = os.path.join(OUTPUT_DIR_DATA, "state.json")
 ANALYSIS_REPORT_FILE = os.path.join(OUTPUT_DIR_DATA, "weekly_analysis.json")
+AI_CACHE_DIR = os.getenv("AI_CACHE_DIR", os.path.join(OUTPUT_DIR_DATA, "ai_cache")) # Set to "" to disable
+AUDIO_INDEX_FILE = os.path.join(OUTPUT_DIR_DATA, "audio_index.json")
+JOB_QUEUE_FILE = os.path.join(OUTPUT_DIR_DATA, "jobs.sqlite3")
+WORKER_POLL_SECONDS = 5
+JOB_MAX_ATTEMPTS = 2
+JOB_STALE_SECONDS = 30 * 60 # Running jobs without a heartbeat for this long are assumed to belong to a dead worker
+JOB_HEARTBEAT_SECONDS = 60 # How often a worker refreshes started_at of the job it is running
 ANALYSIS_INTERVAL_DAYS = 7
+ENGAGEMENT_WEIGHTS = {"Likes": 0.2, "Comments": 0.5, "Shares": 0.3}
+STYLE_STATS_MIN_POSTS = 5 # Posts needed before running stats override the weekly analysis pick
+STYLE_STATS_METRIC = "ewma" # "mean" for all-time averages, "ewma" to favour recent posts
+STYLE_STATS_EWMA_ALPHA = 0.2
+
+# --- Caching ---
+FEED_CACHE_DIR = os.path.join(OUTPUT_DIR_DATA, "feed_cache")
+FEED_CACHE_TTL_SECONDS = int(os.getenv("FEED_CACHE_TTL_SECONDS", 30 * 60))
+ARTICLE_POOL_FILE = os.path.join(OUTPUT_DIR_DATA, "article_pool.json")
+ARTICLE_POOL_HISTORY = 5000 # Used articles remembered for deduplication
+MEDIA_CACHE_DIR = "temp_media"
+MEDIA_CACHE_MAX_BYTES = int(os.getenv("MEDIA_CACHE_MAX_BYTES", 5 * 1024 ** 3))
+MEDIA_CACHE_GRACE_SECONDS = int(os.getenv("MEDIA_CACHE_GRACE_SECONDS", 60 * 60)) # Entries used this recently are never evicted, another process may be rendering them
+DERIVED_CACHE_MAX_BYTES = int(os.getenv("DERIVED_CACHE_MAX_BYTES", 256 * 1024 ** 2)) # Own cap for each of the rendered text and motion score folders
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_SEGMENTS = 4 # Parallel Range requests for large files, 1 disables segmenting
+DOWNLOAD_SEGMENT_THRESHOLD = 16 * 1024 * 1024
+NORMALIZED_MEDIA_DIR = "temp_media/normalized" # Cropped/scaled/trimmed source clips
+TEXT_CACHE_DIR = os.getenv("TEXT_CACHE_DIR", "temp_media/text_cache") # Set to "" to keep rendered text in memory only
+
+# --- Source Clip Selection ---
+MOTION_ANALYSIS = os.getenv("MOTION_ANALYSIS", "1") == "1" # Score Pexels candidates and pick the best window instead of a random clip from 0s
+MOTION_CACHE_DIR = "temp_media/motion" # Per-second scores per source id
+MOTION_PROXY_WIDTH = 72 # Grayscale proxy, cropped to the reel's aspect ratio
+MOTION_PROXY_HEIGHT = 128
+MOTION_PROXY_FPS = 4
+MOTION_MAX_SECONDS = 60 # Only the start of long clips is analyzed
+MOTION_CUT_THRESHOLD = 0.35 # Histogram distance between consecutive proxy frames that counts as a scene cut
+MOTION_ANALYSIS_WORKERS = int(os.getenv("MOTION_ANALYSIS_WORKERS", 4)) # Candidates decoded at once
+
+# --- Metrics ---
+METRICS_DIR = os.getenv("METRICS_DIR", "output/metrics") # <run_id>.jsonl event log and <run_id>.prom per run, "" to disable
+PROFILE_FRAMES = os.getenv("PROFILE_FRAMES", "0") == "1" # Time every composited frame (adds one log line per frame)
@@ -1,40 +1,86 @@
 # content_engine.py
-import feedparser
-import random
 from config import CONTENT_SOURCES
+from feed_cache import FeedCache
+from article_pool import ArticlePool
+import metrics
 import re
 
 class ContentFetcher:
     def __init__(self):
         self.sources = CONTENT_SOURCES
+        self.feed_cache = FeedCache()
+        self.article_pool = ArticlePool(self.feed_cache)
 
     def _clean_html(self, raw_html):
         cleanr = re.compile('<.*?>')
         cleantext = re.sub(cleanr, '', raw_html)
         return cleantext
 
+    def prefetch_all(self):
+        self.article_pool.prefetch(self.sources)
+
+    def _pick_article(self, feed, category):
+        if feed:
+            self.article_pool.add_feed(category, feed)
+        entry = self.article_pool.pick(category)
+        if not entry:
+            print(f"No unused entries found in feed for {category}")
+            return None
+        return self._to_article(entry)
+
+    def _to_article(self, entry):
+        summary = self._clean_html(entry['summary']) if entry.get('summary') else entry['title']
+
+        return {
+            "title": entry['title'],
+            "summary": summary,
+            "link": entry['link'],
+            "source": entry['source']
+        }
+
+    def _pooled_article(self, category):
+        """An unused article from the pool, as long as the pool's copy of the feed is within the feed cache TTL.
+        Otherwise None, and the caller refills the pool from the feed."""
+        entry = self.article_pool.pick(category, max_age=self.feed_cache.ttl_seconds)
+        metrics.cache_lookup("article_pool", entry is not None)
+        if entry:
+            print(f"-> Using prefetched article from {category}.")
+            return self._to_article(entry)
+        return None
+
     def fetch_random_article(self, category):
         rss_url = self.sources.get(category)
         if not rss_url:
             print(f"No RSS URL for category: {category}")
             return None
 
+        article = self._pooled_article(category)
+        if article:
+            return article
+
+        print(f"-> Fetching articles from {category}...")
+        try:
+            feed = self.feed_cache.get_feed(category, rss_url)
+            return self._pick_article(feed, category)
+        except Exception as e:
+            print(f"Error parsing feed for {category}: {e}")
+            return None
+
+    async def fetch_random_article_async(self, category, http_client):
+        """Same as fetch_random_article, but downloads the feed with a shared httpx.AsyncClient."""
+        rss_url = self.sources.get(category)
+        if not rss_url:
+            print(f"No RSS URL for category: {category}")
+            return None
+
+        article = self._pooled_article(category)
+        if article:
+            return article
+
         print(f"-> Fetching articles from {category}...")
         try:
-            feed = feedparser.parse(rss_url)
-            if not feed.entries:
-                print(f"No entries found in feed for {category}")
-                return None
-
-            entry = random.choice(feed.entries)
-            summary = self._clean_html(entry.summary) if hasattr(entry, 'summary') else entry.title
-
-            return {
-                "title": entry.title,
-                "summary": summary,
-                "link": entry.link,
-                "source": feed.feed.title
-            }
+            feed = await self.feed_cache.get_feed_async(category, rss_url, http_client)
+            return self._pick_article(feed, category)
         except Exception as e:
             print(f"Error parsing feed for {category}: {e}")
             return None
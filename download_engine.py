@@ -0,0 +1,121 @@
+# download_engine.py
+import os
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config import DOWNLOAD_CHUNK_SIZE, DOWNLOAD_SEGMENTS, DOWNLOAD_SEGMENT_THRESHOLD
+import metrics
+
+def pick_rendition(video_files, target_width, target_height):
+    """Smallest Pexels rendition whose center crop to the target aspect still covers the target size.
+
+    Falls back to the largest rendition when none is big enough.
+    """
+    sized = [f for f in video_files if f.get('width') and f.get('height')]
+    if not sized:
+        return video_files[0] if video_files else None
+
+    def cropped_width(f):
+        return min(f['width'], f['height'] * target_width / target_height)
+
+    covering = [f for f in sized if cropped_width(f) >= target_width]
+    if covering:
+        return min(covering, key=lambda f: f['width'] * f['height'])
+    return max(sized, key=lambda f: f['width'] * f['height'])
+
+def pick_proxy_rendition(video_files):
+    """Smallest Pexels rendition, for analysis that only needs a thumbnail-sized decode."""
+    sized = [f for f in video_files if f.get('width') and f.get('height')]
+    if not sized:
+        return video_files[0] if video_files else None
+    return min(sized, key=lambda f: f['width'] * f['height'])
+
+class DownloadEngine:
+    """Pooled HTTP session with atomic, resumable and optionally segmented downloads.
+
+    Data is written to `<path>.part` and only renamed to `path` once complete, so a
+    file at `path` is always a finished download.
+    """
+    def __init__(self, pool_size=8, max_attempts=4):
+        self.max_attempts = max_attempts
+        self.session = requests.Session()
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504], allowed_methods=["HEAD", "GET"])
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, url, **kwargs):
+        kwargs.setdefault('timeout', 15)
+        return self.session.get(url, **kwargs)
+
+    def _probe(self, url):
+        try:
+            response = self.session.head(url, allow_redirects=True, timeout=15)
+            response.raise_for_status()
+            size = int(response.headers.get('Content-Length', 0)) or None
+            return size, response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+        except Exception:
+            return None, False
+
+    def _fetch_range(self, url, part_path, start, end=None):
+        """Writes bytes [start, end] of `url` into `part_path` at offset `start`, resuming after failures."""
+        offset = start
+        for attempt in range(self.max_attempts):
+            headers = {"Range": f"bytes={offset}-{'' if end is None else end}"} if offset or end is not None else {}
+            try:
+                with self.session.get(url, headers=headers, stream=True, timeout=15) as response:
+                    response.raise_for_status()
+                    if response.status_code == 206:
+                        mode = 'r+b' if os.path.exists(part_path) else 'wb'
+                    elif start or end is not None:
+                        raise IOError("Server ignored the Range header")
+                    else:
+                        offset, mode = 0, 'wb'
+                    with open(part_path, mode) as f:
+                        f.seek(offset)
+                        for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                            f.write(chunk)
+                            offset += len(chunk)
+                            metrics.inc("downloaded_bytes_total", len(chunk), client="requests")
+                return offset - start
+            except (requests.RequestException, IOError) as e:
+                if attempt == self.max_attempts - 1:
+                    raise
+                print(f"   - Download interrupted at {offset} bytes ({e}), resuming...")
+                metrics.inc("retries_total", component="download")
+
+    def _download_segments(self, url, part_path, size):
+        """Fetches `size` bytes as parallel Range requests into a preallocated file."""
+        segment_size = -(-size // DOWNLOAD_SEGMENTS)
+        ranges = [(start, min(start + segment_size, size) - 1) for start in range(0, size, segment_size)]
+        try:
+            with open(part_path, 'wb') as f:
+                f.truncate(size)
+            with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+                list(executor.map(lambda r: self._fetch_range(url, part_path, r[0], r[1]), ranges))
+        except Exception:
+            # A preallocated file can't be resumed linearly, so drop it.
+            os.remove(part_path)
+            raise
+
+    def download(self, url, path):
+        part_path = f"{path}.part"
+        size, accepts_ranges = self._probe(url)
+        resume_from = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+
+        if size and accepts_ranges and size >= DOWNLOAD_SEGMENT_THRESHOLD and DOWNLOAD_SEGMENTS > 1 and not resume_from:
+            self._download_segments(url, f"{path}.segments.part", size)
+            os.replace(f"{path}.segments.part", part_path)
+        else:
+            if resume_from and (not accepts_ranges or (size and resume_from > size)):
+                resume_from = 0
+            if not (size and resume_from == size):
+                if resume_from:
+                    print(f"   - Resuming download from {resume_from} bytes")
+                self._fetch_range(url, part_path, resume_from)
+
+        if size and os.path.getsize(part_path) != size:
+            raise IOError(f"Incomplete download: expected {size} bytes, got {os.path.getsize(part_path)}")
+        os.replace(part_path, path)
+        return path
@@ -0,0 +1,108 @@
+# encoder.py
+# Streams raw RGB frames into a persistent ffmpeg process. Audio is read and trimmed by
+# ffmpeg itself from the source file, so no temp audio file is ever written.
+import os
+import shutil
+import subprocess
+import tempfile
+from config import ENCODING_PROFILES, DEFAULT_ENCODING_PROFILE
+
+def get_ffmpeg_exe():
+    """Prefers the ffmpeg binary bundled with imageio-ffmpeg (a moviepy dependency), then the one on PATH."""
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return shutil.which("ffmpeg") or "ffmpeg"
+
+def crop_scale_filter(width, height):
+    """ffmpeg filter that center-crops any input to width:height's aspect ratio, then scales it to width x height."""
+    return (f"crop='trunc(min(iw,ih*{width}/{height})/2)*2':'trunc(min(ih,iw*{height}/{width})/2)*2',"
+            f"scale={width}:{height}:flags=bicubic,setsar=1")
+
+class FFmpegEncoder:
+    """Usage:
+        with FFmpegEncoder(path, (REEL_WIDTH, REEL_HEIGHT), 30, audio={...}) as encoder:
+            for frame in frames:
+                encoder.write_frame(frame)
+
+    `audio` is an optional dict with `path`, `start`, `duration` and `volume`.
+    The file is written to `<output>.part` and renamed into place only after ffmpeg succeeds.
+    ffmpeg's stderr goes to an anonymous temp file that is only read on failure, so a chatty
+    encode can never fill a pipe and block write_frame.
+    """
+    def __init__(self, output_path, size, fps, profile=DEFAULT_ENCODING_PROFILE, audio=None, video_filter=None):
+        self.output_path = output_path
+        self.size = size
+        self.fps = fps
+        self.profile = ENCODING_PROFILES[profile] if isinstance(profile, str) else profile
+        self.audio = audio
+        self.video_filter = video_filter
+        self.temp_path = f"{output_path}.part"
+        self.process = None
+        self.stderr_file = None
+        self.frames_written = 0
+
+    def _command(self):
+        width, height = self.size
+        profile = self.profile
+        cmd = [get_ffmpeg_exe(), "-y", "-loglevel", "error",
+               "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", f"{self.fps}", "-i", "-"]
+        if self.audio:
+            cmd += ["-ss", f"{self.audio.get('start', 0):.3f}", "-t", f"{self.audio['duration']:.3f}", "-i", self.audio['path']]
+        cmd += ["-map", "0:v"]
+        if self.video_filter:
+            cmd += ["-vf", self.video_filter]
+        cmd += ["-c:v", profile['codec'], "-preset", profile['preset'], "-crf", str(profile['crf']),
+                "-pix_fmt", profile['pix_fmt'], "-threads", str(profile.get('threads', 0))]
+        if self.audio:
+            cmd += ["-map", "1:a", "-af", f"volume={self.audio.get('volume', 1.0)}",
+                    "-c:a", profile.get('audio_codec', 'aac'), "-b:a", profile.get('audio_bitrate', '128k'), "-shortest"]
+        cmd += ["-movflags", "+faststart", "-f", "mp4", self.temp_path]
+        return cmd
+
+    def open(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.output_path)), exist_ok=True)
+        self.stderr_file = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(self._command(), stdin=subprocess.PIPE, stderr=self.stderr_file)
+        return self
+
+    def _stderr(self):
+        self.stderr_file.seek(0)
+        return self.stderr_file.read().decode(errors='replace').strip()
+
+    def write_frame(self, frame):
+        try:
+            self.process.stdin.write(memoryview(frame if frame.flags.c_contiguous else frame.copy()))
+        except BrokenPipeError:
+            self.process.wait()
+            raise IOError(f"ffmpeg exited early while encoding {self.output_path}: {self._stderr()}")
+        self.frames_written += 1
+
+    def close(self):
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            error = self._stderr()
+            self.abort()
+            raise IOError(f"ffmpeg failed to encode {self.output_path}: {error}")
+        self.stderr_file.close()
+        os.replace(self.temp_path, self.output_path)
+
+    def abort(self):
+        if self.process and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        if self.stderr_file:
+            self.stderr_file.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
@@ -0,0 +1,120 @@
+# feed_cache.py
+import json
+import os
+import re
+import time
+from config import FEED_CACHE_DIR, FEED_CACHE_TTL_SECONDS
+from file_utils import write_json
+import metrics
+
+class FeedCache:
+    """On-disk cache of parsed RSS feeds, one JSON file per CONTENT_SOURCES entry.
+
+    Within the TTL a feed is served straight from disk. After that a conditional
+    request (ETag / Last-Modified) is sent and a 304 simply refreshes the cached copy.
+    """
+    def __init__(self, cache_dir=FEED_CACHE_DIR, ttl_seconds=FEED_CACHE_TTL_SECONDS):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, category):
+        safe_name = re.sub(r'[^A-Za-z0-9_-]+', '_', category)
+        return os.path.join(self.cache_dir, f"{safe_name}.json")
+
+    def load(self, category):
+        path = self._path(category)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"   - Ignoring unreadable feed cache for {category}: {e}")
+            return None
+
+    def _save(self, category, cached):
+        write_json(self._path(category), cached)
+
+    def is_fresh(self, cached):
+        return cached is not None and time.time() - cached.get('fetched_at', 0) < self.ttl_seconds
+
+    def conditional_headers(self, cached):
+        headers = {}
+        if cached and cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached and cached.get('modified'):
+            headers['If-Modified-Since'] = cached['modified']
+        return headers
+
+    def mark_not_modified(self, category, cached):
+        cached['fetched_at'] = time.time()
+        self._save(category, cached)
+        return cached
+
+    def store(self, category, feed, etag=None, modified=None):
+        """Keeps only the fields the pipeline uses so cache files stay small."""
+        cached = {
+            "source": feed.feed.get('title', category),
+            "etag": etag,
+            "modified": modified,
+            "fetched_at": time.time(),
+            "entries": [
+                {
+                    "title": entry.get('title', ''),
+                    "summary": entry.get('summary'),
+                    "link": entry.get('link', '')
+                }
+                for entry in feed.entries
+            ]
+        }
+        self._save(category, cached)
+        return cached
+
+    def _lookup(self, category):
+        """(cached copy, whether it is fresh enough to serve without a request)."""
+        cached = self.load(category)
+        if self.is_fresh(cached):
+            print(f"   - Using cached feed for {category}")
+            metrics.cache_lookup("feed", True)
+            return cached, True
+        return cached, False
+
+    def _resolve(self, category, cached, status, feed, etag=None, modified=None):
+        """Turns the answer to a conditional request into the feed to use, updating the cache."""
+        if status == 304 and cached:
+            print(f"   - Feed not modified for {category}, using cache")
+            metrics.cache_lookup("feed", True)
+            return self.mark_not_modified(category, cached)
+        metrics.cache_lookup("feed", False)
+        if feed is None or not feed.entries:
+            if cached:
+                print(f"   - Feed fetch for {category} returned nothing, serving stale cache")
+            return cached
+        return self.store(category, feed, etag, modified)
+
+    def get_feed(self, category, rss_url):
+        cached, fresh = self._lookup(category)
+        if fresh:
+            return cached
+
+        kwargs = {}
+        if cached:
+            kwargs = {"etag": cached.get('etag'), "modified": cached.get('modified')}
+        import feedparser
+        feed = feedparser.parse(rss_url, **kwargs)
+        return self._resolve(category, cached, feed.get('status'), feed, feed.get('etag'), feed.get('modified'))
+
+    async def get_feed_async(self, category, rss_url, http_client):
+        """Same as get_feed, but downloads the feed with a shared httpx.AsyncClient."""
+        cached, fresh = self._lookup(category)
+        if fresh:
+            return cached
+
+        response = await http_client.get(rss_url, headers=self.conditional_headers(cached), timeout=15, follow_redirects=True)
+        if response.status_code == 304:
+            return self._resolve(category, cached, 304, None)
+        response.raise_for_status()
+        import feedparser
+        feed = feedparser.parse(response.content)
+        return self._resolve(category, cached, response.status_code, feed, response.headers.get('ETag'), response.headers.get('Last-Modified'))
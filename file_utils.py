@@ -0,0 +1,53 @@
+# file_utils.py
+# Atomic writes, cross-process locks and SQLite connections for the files several processes share
+# (state, indexes, caches, the job queue and the post history).
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError: # Windows: writes are still atomic, but concurrent runs aren't serialized
+    fcntl = None
+
+SQLITE_TIMEOUT_SECONDS = 30 # How long a writer waits for another process's transaction before failing
+
+@contextmanager
+def atomic_write(path, mode='w'):
+    """Yields a file for the new contents of `path`, which replace it in one rename when the block succeeds.
+    Readers never see a partial file, and the temp name is per process so concurrent writers can't collide."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, mode) as f:
+            yield f
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def write_json(path, data, **kwargs):
+    with atomic_write(path) as f:
+        json.dump(data, f, **kwargs)
+
+@contextmanager
+def file_lock(path):
+    """Exclusive lock on `path` (e.g. 'state.json.lock') shared with every other process, held for the block."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, 'a') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield # Closing the file releases the flock
+
+@contextmanager
+def sqlite_connection(db_file):
+    """WAL-mode connection whose block runs as one transaction (committed on success, rolled back on error).
+    Rows can be read by column name or index."""
+    conn = sqlite3.connect(db_file, timeout=SQLITE_TIMEOUT_SECONDS)
+    conn.row_factory = sqlite3.Row
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            yield conn
+    finally:
+        conn.close()
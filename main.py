@@ -1,76 +1,286 @@
 # main.py
 import os
-from content_engine import ContentFetcher
-from ai_engine import AIProcessor
-from media_engine import MediaFetcher
-from video_engine import create_reel
-from analysis_engine import save_post_data, run_weekly_analysis
+import sys
+import argparse
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from state_manager import StateManager
-from config import OUTPUT_DIR_VIDEO
+from config import OUTPUT_DIR_VIDEO, AI_COMBINED_MODE, RENDER_VARIANTS, DEFAULT_RENDER_VARIANT
+import metrics
 
-def main():
-    print("🚀 Starting NextGen Signals AI Reel Engine v3.0...")
-
-    # --- Initialization ---
-    state_manager = StateManager()
-    content_fetcher = ContentFetcher()
-    ai_processor = AIProcessor()
-    media_fetcher = MediaFetcher()
-
-    # --- Weekly Analysis & Strategy ---
-    run_weekly_analysis(state_manager)
-
-    # --- Content & Style Selection ---
-    category, story_style_prompt = state_manager.get_next_story_style()
-    edit_style_key, edit_style_params = state_manager.get_next_editing_style()
-    print(f"🎬 Category: {category} | Story: '{state_manager.get_last_story_key()}' | Edit: '{edit_style_key}'")
+def prepare_post(plan, content_fetcher, ai_processor, media_fetcher, article=None, package=None):
+    """Fetches the article, script and media for a planned post. Returns a render job or None.
 
-    article = content_fetcher.fetch_random_article(category)
+    Batch mode passes in the article and combined AI package it already generated.
+    """
+    category = plan['category']
+    if not article:
+        with metrics.span("fetch", category=category):
+            article = content_fetcher.fetch_random_article(category)
     if not article:
         print("-> Could not fetch an article. Stopping run.")
-        return
+        return None
 
     # --- AI Content Generation ---
     print("🧠 Generating script with AI...")
-    hook, revelation = ai_processor.generate_hook_and_revelation(article['summary'], story_style_prompt)
+    with metrics.span("ai", call="script"):
+        if package is None and AI_COMBINED_MODE:
+            package = ai_processor.generate_post_package(article['summary'], plan['story_prompt'], category, article['source'])
+            if not package:
+                print("-> Combined AI response could not be parsed, falling back to separate calls.")
+        if package:
+            hook, revelation = package['hook'], package['revelation']
+        else:
+            hook, revelation = ai_processor.generate_hook_and_revelation(article['summary'], plan['story_prompt'])
     if not hook or not revelation:
         print("-> AI failed to generate script. Stopping run.")
-        return
+        return None
     print(f"   - Hook: {hook}\n   - Revelation: {revelation}")
 
     # --- Media Sourcing ---
     print("🎥 Sourcing video and music...")
     search_query = f"abstract technology {category}"
-    video_path, video_credit = media_fetcher.get_video(search_query)
-    music_path, music_credit = media_fetcher.get_music() # Query not needed for current logic
+    with metrics.span("media"):
+        video = media_fetcher.get_video(search_query)
+        music = media_fetcher.get_music() # Query not needed for current logic
+    return build_job(plan, article, package, hook, revelation, video, music)
+
+def build_job(plan, article, package, hook, revelation, video, music):
+    """The render job for a post, from the (path, credit, start) video and (path, credit) music results. None if either is missing."""
+    (video_path, video_credit, video_start), (music_path, music_credit) = video, music
     if not video_path or not music_path:
         print("-> Failed to source media. Stopping run.")
-        return
+        return None
 
-    # --- Reel Composition ---
-    print(f"🎞️ Composing video with '{edit_style_key}' style...")
     os.makedirs(OUTPUT_DIR_VIDEO, exist_ok=True)
-    post_id = f"{category.replace(' ', '')}_{state_manager.get_run_count()}"
-    output_video_path = os.path.join(OUTPUT_DIR_VIDEO, f"{post_id}.mp4")
+    post_id = f"{plan['category'].replace(' ', '')}_{plan['run_number']}"
+    return dict(plan,
+        post_id=post_id,
+        article=article,
+        package=package,
+        hook=hook,
+        revelation=revelation,
+        video_path=video_path,
+        video_start=video_start,
+        video_credit=video_credit,
+        music_path=music_path,
+        music_credit=music_credit,
+        output_video_path=os.path.join(OUTPUT_DIR_VIDEO, f"{post_id}.mp4")
+    )
 
-    success = create_reel(video_path, music_path, hook, revelation, output_video_path, edit_style_params)
-    if not success:
-        print("-> Failed to create video file. Stopping run.")
-        return
+def render_post_worker(job, run_id):
+    """render_post for a batch worker process: returns (success, metrics snapshot) so the parent can merge them."""
+    run = metrics.start_run(run_id)
+    return render_post(job), run.snapshot()
 
+def render_post(job):
+    print(f"🎞️ Composing video with '{job['edit_key']}' style...")
+    from video_engine import create_reel, create_reel_variants, variant_paths
+    with metrics.span("render", post_id=job['post_id']):
+        if RENDER_VARIANTS != [DEFAULT_RENDER_VARIANT] and not job.get('preview'):
+            # One decode + composite pass feeds every format; the first variant stays at output_video_path.
+            job['variant_paths'] = variant_paths(job['output_video_path'], RENDER_VARIANTS)
+            return create_reel_variants(job['video_path'], job['music_path'], job['hook'], job['revelation'], job['variant_paths'], job['edit_params'], start=job.get('video_start', 0.0))
+        return create_reel(job['video_path'], job['music_path'], job['hook'], job['revelation'], job['output_video_path'], job['edit_params'], preview=job.get('preview', False), start=job.get('video_start', 0.0))
+
+def media_credit_info(job):
+    video_credit, music_credit = job['video_credit'], job['music_credit']
+    return f"Video by {video_credit}, Music by {music_credit}" if video_credit and music_credit else "Pexels/Jamendo/Local"
+
+def packaged_copy(job, ai_processor):
+    """(caption, hashtags) from the combined AI package, or None if they still have to be generated."""
+    if not job.get('package'):
+        return None
+    return ai_processor.add_credits(job['package']['caption'], media_credit_info(job)), job['package']['hashtags']
+
+def finalize_post(job, ai_processor, state_manager):
     # --- Caption & Hashtags ---
-    print("✍️ Generating caption and hashtags...")
-    media_credit_info = f"Video by {video_credit}, Music by {music_credit}" if video_credit and music_credit else "Pexels/Jamendo/Local"
-    caption = ai_processor.generate_caption(hook, revelation, article['source'], media_credit_info)
-    hashtags = ai_processor.generate_hashtags(f"{category} {hook}")
+    copy = packaged_copy(job, ai_processor)
+    if copy:
+        caption, hashtags = copy
+    else:
+        print("✍️ Generating caption and hashtags...")
+        with metrics.span("ai", call="caption"):
+            caption = ai_processor.generate_caption(job['hook'], job['revelation'], job['article']['source'], media_credit_info(job))
+            hashtags = ai_processor.generate_hashtags(f"{job['category']} {job['hook']}")
+    return save_post(job, caption, hashtags, state_manager)
+
+def save_post(job, caption, hashtags, state_manager):
+    """Stores the finished post for analysis and feeds its style metrics back into the state."""
+    from analysis_engine import save_post_data
+    with metrics.span("save", post_id=job['post_id']):
+        post = save_post_data(job['post_id'], job['category'], job['story_key'], job['edit_key'], job['hook'], caption, hashtags)
+        state_manager.record_post_metrics(post)
+    metrics.inc("posts_total", status="created")
+    print(f"✅ Post data saved for {job['post_id']}.")
+    return post
 
-    # --- Save Data for Analysis ---
-    save_post_data(post_id, category, state_manager.get_last_story_key(), edit_style_key, hook, caption, hashtags)
-    print(f"✅ Post data saved for {post_id}.")
+def publish_caption(post):
+    return f"{post['Caption']}\n\n{post['Hashtags']}" if post['Hashtags'] else post['Caption']
 
-    # --- Update State for Next Run ---
-    state_manager.increment_run_count()
+def main(preview=False, publish=False):
+    print("🚀 Starting NextGen Signals AI Reel Engine v3.0...")
+
+    # --- Initialization ---
+    # Heavy modules (moviepy, pandas, openai, feedparser) are only imported once a run actually starts.
+    from content_engine import ContentFetcher
+    from ai_engine import AIProcessor
+    from media_engine import MediaFetcher
+    from analysis_engine import run_weekly_analysis
+
+    state_manager = StateManager()
+    content_fetcher = ContentFetcher()
+    ai_processor = AIProcessor()
+    media_fetcher = MediaFetcher()
+
+    # --- Weekly Analysis & Strategy ---
+    run_weekly_analysis(state_manager)
+
+    # --- Content & Style Selection ---
+    # The slot is reserved up front so concurrent runs never share a post_id. Previews don't take one.
+    plan = state_manager.get_next_plan() if preview else state_manager.reserve_next_slot()
+    print(f"🎬 Category: {plan['category']} | Story: '{plan['story_key']}' | Edit: '{plan['edit_key']}'")
+
+    job = prepare_post(plan, content_fetcher, ai_processor, media_fetcher)
+    if not job:
+        return
+
+    if preview:
+        # Drafts are for review only: nothing is saved and the run counter doesn't move.
+        job['preview'] = True
+        job['output_video_path'] = job['output_video_path'].replace(".mp4", "_preview.mp4")
+        if render_post(job):
+            from video_engine import render_frame
+            render_frame(job['video_path'], job['hook'], job['revelation'], 2.0, job['output_video_path'].replace(".mp4", "_cover.png"), job['edit_params'], start=job.get('video_start', 0.0))
+        print("\n👀 Preview complete. Nothing was saved.")
+        return
+
+    # --- Reel Composition ---
+    if not render_post(job):
+        print("-> Failed to create video file. Stopping run.")
+        metrics.inc("posts_total", status="failed")
+        return
+
+    post = finalize_post(job, ai_processor, state_manager)
+
+    if publish:
+        from publishing_engine import Publisher
+        print("📤 Publishing reel...")
+        with Publisher() as publisher:
+            publisher.submit(job['output_video_path'], job['post_id'], publish_caption(post))
     print("\n✨ Process complete. Ready for next run.")
 
+def run_batch(count, workers, publish=False):
+    print(f"🚀 Starting NextGen Signals AI Reel Engine v3.0 in batch mode ({count} reels, {workers} workers)...")
+
+    # Heavy modules (moviepy, pandas, openai, feedparser) are only imported once a run actually starts.
+    from content_engine import ContentFetcher
+    from ai_engine import AIProcessor
+    from media_engine import MediaFetcher
+    from analysis_engine import run_weekly_analysis
+    from audio_library import AudioLibrary
+
+    state_manager = StateManager()
+    content_fetcher = ContentFetcher()
+    ai_processor = AIProcessor()
+    media_fetcher = MediaFetcher()
+
+    run_weekly_analysis(state_manager)
+    content_fetcher.prefetch_all()
+    # Known tracks are analyzed once here rather than in every render process.
+    AudioLibrary().build()
+
+    # Run numbers are reserved up front so failed slots never collide with later runs.
+    plans = state_manager.plan_posts(count)
+    articles = [content_fetcher.fetch_random_article(plan['category']) for plan in plans]
+
+    # Scripts for every article are requested concurrently, within the OpenRouter rate limit.
+    packages = [None] * len(plans)
+    if AI_COMBINED_MODE:
+        print(f"🧠 Generating {sum(1 for a in articles if a)} scripts concurrently...")
+        items = [(article['summary'], plan['story_prompt'], plan['category'], article['source']) for plan, article in zip(plans, articles) if article]
+        results = iter(asyncio.run(ai_processor.generate_post_packages_async(items)))
+        packages = [next(results) if article else None for article in articles]
+
+    # Finished reels are published in the background while later ones are still rendering.
+    publisher = None
+    if publish:
+        from publishing_engine import Publisher
+        publisher = Publisher()
+
+    completed = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        renders = {}
+        for plan, article, package in zip(plans, articles, packages):
+            print(f"🎬 [{plan['run_number']}] Category: {plan['category']} | Story: '{plan['story_key']}' | Edit: '{plan['edit_key']}'")
+            if not article:
+                print("-> Could not fetch an article. Skipping.")
+                continue
+            job = prepare_post(plan, content_fetcher, ai_processor, media_fetcher, article, package)
+            if job:
+                renders[pool.submit(render_post_worker, job, metrics.current().run_id)] = job
+
+        for future in as_completed(renders):
+            job = renders[future]
+            try:
+                success, worker_metrics = future.result()
+                metrics.current().merge(worker_metrics)
+            except Exception as e:
+                print(f"-> Render worker crashed for {job['post_id']}: {e}")
+                success = False
+            if not success:
+                print(f"-> Failed to create video file for {job['post_id']}.")
+                metrics.inc("posts_total", status="failed")
+                continue
+            post = finalize_post(job, ai_processor, state_manager)
+            completed += 1
+            if publisher:
+                publisher.submit(job['output_video_path'], job['post_id'], publish_caption(post))
+
+    if publisher:
+        print("📤 Waiting for uploads and Instagram processing to finish...")
+        published = sum(1 for result in publisher.close() if result)
+        print(f"-> {published}/{completed} reels published.")
+    print(f"\n✨ Batch complete. {completed}/{count} reels created.")
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="NextGen Signals AI Reel Engine")
+    parser.add_argument("--count", type=int, default=1, help="Number of reels to produce in this run.")
+    parser.add_argument("--workers", type=int, help="Render processes used in batch mode (default: one per CPU).")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Run the network stages concurrently with asyncio.")
+    parser.add_argument("--preview", action="store_true", help="Render a low-resolution draft and cover frame for review without saving the post.")
+    parser.add_argument("--publish", action="store_true", help="Upload finished reels to Cloudinary and post them to Instagram.")
+    parser.add_argument("--preflight", action="store_true", help="Check keys, fonts, logo, music and ffmpeg, then exit.")
+    parser.add_argument("--export-excel", action="store_true", help="Export the post history to all_posts.xlsx and exit.")
+    args = parser.parse_args()
+    if args.preview and (args.count > 1 or args.workers or args.publish or args.use_async):
+        parser.error("--preview renders a single unsaved draft; it can't be combined with --count, --workers, --publish or --async.")
+    if args.use_async and (args.count > 1 or args.workers):
+        parser.error("--async produces a single reel; it can't be combined with --count or --workers.")
+    if args.workers and args.count == 1:
+        parser.error("--workers only applies to batch mode; use it with --count N.")
+
+    if args.export_excel:
+        from analysis_engine import export_posts_to_excel
+        export_posts_to_excel()
+    elif args.preflight:
+        from preflight import run_preflight
+        sys.exit(0 if run_preflight() else 1)
+    else:
+        from preflight import run_preflight
+        if not run_preflight(verbose=False):
+            print("-> Preflight failed, stopping before any work. Run with --preflight for details.")
+            sys.exit(1)
+        metrics.start_run()
+        try:
+            if args.preview:
+                main(preview=True)
+            elif args.use_async:
+                from async_pipeline import main_async
+                asyncio.run(main_async(publish=args.publish))
+            elif args.count > 1:
+                run_batch(args.count, max(1, args.workers or os.cpu_count() or 1), args.publish)
+            else:
+                main(publish=args.publish)
+        finally:
+            metrics.finish_run()
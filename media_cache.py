@@ -0,0 +1,202 @@
+# media_cache.py
+# Content-addressed cache for downloaded and derived media in temp_media/.
+# Usage: python media_cache.py [stats|evict|verify [--repair]]
+import hashlib
+import os
+import shutil
+import sys
+import time
+from config import MEDIA_CACHE_DIR, MEDIA_CACHE_MAX_BYTES, MEDIA_CACHE_GRACE_SECONDS, DERIVED_CACHE_MAX_BYTES, TEXT_CACHE_DIR, MOTION_CACHE_DIR
+from file_utils import sqlite_connection
+import metrics
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def probe_media(path):
+    """Duration and resolution via ffmpeg. Imported lazily since moviepy is heavy."""
+    try:
+        from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+        infos = ffmpeg_parse_infos(path)
+        width, height = infos.get('video_size') or (None, None)
+        return infos.get('duration'), width, height
+    except Exception as e:
+        print(f"   - Could not probe {path}: {e}")
+        return None, None, None
+
+def prune_dir(directory, max_bytes, grace_seconds=MEDIA_CACHE_GRACE_SECONDS):
+    """Deletes the least recently modified files in `directory` until it fits in `max_bytes`.
+    Files modified within the grace window are kept. Returns the number deleted."""
+    if not os.path.isdir(directory):
+        return 0
+    files = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in os.scandir(directory) if entry.is_file())
+    total = sum(size for _, size, _ in files)
+    cutoff = time.time() - grace_seconds
+    deleted = 0
+    for mtime, size, path in files:
+        if total <= max_bytes or mtime >= cutoff:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        deleted += 1
+    if deleted:
+        print(f"   - Pruned {deleted} files from {directory} ({total / 1e6:.1f} MB in use)")
+    return deleted
+
+class MediaCache:
+    """Files live at objects/<sha[:2]>/<sha><ext>; the SQLite index maps a cache key
+    (e.g. 'pexels_123.mp4') to its object plus probed metadata and usage stats.
+
+    Derived caches that aren't indexed (rendered text, motion scores) get their own
+    DERIVED_CACHE_MAX_BYTES cap, enforced by evict() as well."""
+    def __init__(self, cache_dir=MEDIA_CACHE_DIR, max_bytes=MEDIA_CACHE_MAX_BYTES, derived_dirs=(TEXT_CACHE_DIR, MOTION_CACHE_DIR)):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.derived_dirs = [directory for directory in derived_dirs if directory]
+        self.objects_dir = os.path.join(cache_dir, "objects")
+        self.index_file = os.path.join(cache_dir, "index.sqlite3")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS media (
+                key TEXT PRIMARY KEY, sha256 TEXT NOT NULL, path TEXT NOT NULL, source_id TEXT,
+                size INTEGER, duration REAL, width INTEGER, height INTEGER,
+                created_at REAL, last_access REAL, hit_count INTEGER DEFAULT 0)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS media_last_access ON media (last_access)")
+
+    def _connect(self):
+        return sqlite_connection(self.index_file)
+
+    def incoming_path(self, key):
+        """Stable staging location for a download, so interrupted downloads can resume."""
+        os.makedirs(os.path.join(self.cache_dir, "incoming"), exist_ok=True)
+        return os.path.join(self.cache_dir, "incoming", key)
+
+    def get_entry(self, key):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM media WHERE key = ?", (key,)).fetchone()
+        return dict(row) if row else None
+
+    def lookup(self, key):
+        """Returns the cached path for `key` (recording the hit) or None."""
+        entry = self.get_entry(key)
+        if entry and not os.path.exists(entry['path']):
+            self._delete(key)
+            entry = None
+        metrics.cache_lookup("media", entry is not None)
+        if not entry:
+            return None
+        with self._connect() as conn:
+            conn.execute("UPDATE media SET last_access = ?, hit_count = hit_count + 1 WHERE key = ?", (time.time(), key))
+        return entry['path']
+
+    def add(self, key, file_path, source_id=None):
+        """Moves `file_path` into the object store under its content hash and indexes it."""
+        sha = file_sha256(file_path)
+        ext = os.path.splitext(key)[1]
+        object_path = os.path.join(self.objects_dir, sha[:2], f"{sha}{ext}")
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        if os.path.exists(object_path):
+            os.remove(file_path)
+        else:
+            shutil.move(file_path, object_path)
+
+        duration, width, height = probe_media(object_path)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("""INSERT OR REPLACE INTO media
+                (key, sha256, path, source_id, size, duration, width, height, created_at, last_access, hit_count)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0)""",
+                (key, sha, object_path, source_id or os.path.splitext(key)[0], os.path.getsize(object_path), duration, width, height, now, now))
+        self.evict(keep=(key,))
+        return object_path
+
+    def find(self, key_prefix="", min_duration=0):
+        """Indexed entries matching a key prefix, most recently used first. No probing needed."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM media WHERE key LIKE ? AND COALESCE(duration, 0) >= ? ORDER BY last_access DESC",
+                                (f"{key_prefix}%", min_duration)).fetchall()
+        return [dict(row) for row in rows if os.path.exists(row['path'])]
+
+    def _delete(self, key):
+        with self._connect() as conn:
+            row = conn.execute("SELECT path FROM media WHERE key = ?", (key,)).fetchone()
+            conn.execute("DELETE FROM media WHERE key = ?", (key,))
+            still_used = row and conn.execute("SELECT 1 FROM media WHERE path = ?", (row['path'],)).fetchone()
+        if row and not still_used and os.path.exists(row['path']):
+            os.remove(row['path'])
+
+    def total_bytes(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT path, size FROM media)").fetchone()[0]
+
+    def evict(self, max_bytes=None, keep=(), grace_seconds=MEDIA_CACHE_GRACE_SECONDS):
+        """Drops least recently used entries until the cache fits in `max_bytes`.
+
+        Keys in `keep` and entries used within the grace window are never dropped, so a file
+        that was just added or that another process may be rendering from stays in place.
+        """
+        for directory in self.derived_dirs:
+            prune_dir(directory, DERIVED_CACHE_MAX_BYTES, grace_seconds)
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        total = self.total_bytes()
+        if total <= max_bytes:
+            return 0
+        with self._connect() as conn:
+            rows = conn.execute("SELECT key, size FROM media WHERE last_access < ? ORDER BY last_access ASC",
+                                (time.time() - grace_seconds,)).fetchall()
+        evicted = 0
+        for row in rows:
+            if total <= max_bytes:
+                break
+            if row['key'] in keep:
+                continue
+            self._delete(row['key'])
+            total -= row['size'] or 0
+            evicted += 1
+        print(f"   - Media cache evicted {evicted} entries ({total / 1e6:.1f} MB in use)")
+        if total > max_bytes:
+            print(f"   - Media cache is still over its {max_bytes / 1e6:.0f} MB budget, the rest is in use")
+        return evicted
+
+    def verify(self, repair=False):
+        """Checks every entry's file and hash. With repair, broken entries and orphan objects are removed."""
+        problems = []
+        with self._connect() as conn:
+            rows = [dict(row) for row in conn.execute("SELECT * FROM media").fetchall()]
+        for entry in rows:
+            if not os.path.exists(entry['path']):
+                problems.append((entry['key'], "missing file"))
+            elif file_sha256(entry['path']) != entry['sha256']:
+                problems.append((entry['key'], "hash mismatch"))
+        indexed = {entry['path'] for entry in rows}
+        orphans = [os.path.join(root, name) for root, _, names in os.walk(self.objects_dir) for name in names
+                   if os.path.join(root, name) not in indexed]
+
+        for key, problem in problems:
+            print(f"   - {key}: {problem}")
+            if repair:
+                self._delete(key)
+        for path in orphans:
+            print(f"   - orphan object: {path}")
+            if repair:
+                os.remove(path)
+        return problems, orphans
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    cache = MediaCache()
+    if command == "verify":
+        problems, orphans = cache.verify(repair="--repair" in sys.argv)
+        print(f"-> {len(problems)} broken entries, {len(orphans)} orphan objects.")
+    elif command == "evict":
+        cache.evict()
+    else:
+        entries = cache.find()
+        print(f"-> {len(entries)} entries, {cache.total_bytes() / 1e6:.1f} MB of {cache.max_bytes / 1e6:.0f} MB budget.")
@@ -1,62 +1,131 @@
 # media_engine.py
-import requests
+import asyncio
 import os
 import random
-from config import PEXELS_API_KEY, JAMENDO_CLIENT_ID
+from config import PEXELS_API_KEY, JAMENDO_CLIENT_ID, REEL_WIDTH, REEL_HEIGHT, REEL_DURATION_SECONDS, MEDIA_CACHE_DIR, MOTION_ANALYSIS
+from download_engine import DownloadEngine, pick_rendition, pick_proxy_rendition
+from media_cache import MediaCache
+from audio_library import AudioLibrary
+import metrics
+
+PEXELS_SEARCH_URL = "https://api.pexels.com/videos/search"
+JAMENDO_TRACKS_URL = "https://api.jamendo.com/v3.0/tracks/"
 
 class MediaFetcher:
     def __init__(self):
-        os.makedirs("temp_media", exist_ok=True)
+        os.makedirs(MEDIA_CACHE_DIR, exist_ok=True)
         os.makedirs("audio", exist_ok=True) # <-- CHANGED
+        self.downloads = DownloadEngine()
+        self.media_cache = MediaCache()
+
+    def _cached_path(self, filename):
+        """Returns (cached path, True) on a cache hit, else (staging path for the download, False)."""
+        legacy_path = os.path.join(MEDIA_CACHE_DIR, filename)
+        if os.path.exists(legacy_path):
+            self.media_cache.add(filename, legacy_path) # Adopt files cached before the index existed
+        path = self.media_cache.lookup(filename)
+        if path:
+            print(f"   - Using cached media: {filename}")
+            return path, True
+        return self.media_cache.incoming_path(filename), False
 
     def _download_file(self, url, filename):
         try:
-            path = os.path.join("temp_media", filename)
-            if os.path.exists(path):
-                print(f"   - Using cached media: {filename}")
+            path, cached = self._cached_path(filename)
+            if cached:
                 return path
                 
-            response = requests.get(url, stream=True, timeout=15)
-            response.raise_for_status()
-            with open(path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
+            self.downloads.download(url, path)
             print(f"   - Downloaded media: {filename}")
-            return path
+            return self.media_cache.add(filename, path)
         except Exception as e:
             print(f"Error downloading {url}: {e}")
             return None
 
+    async def _download_file_async(self, url, filename, http_client):
+        try:
+            # Adopting and indexing files hashes them and runs ffprobe, so that stays off the event loop.
+            path, cached = await asyncio.to_thread(self._cached_path, filename)
+            if cached:
+                return path
+
+            part_path = f"{path}.part"
+            async with http_client.stream("GET", url, timeout=15, follow_redirects=True) as response:
+                response.raise_for_status()
+                with open(part_path, 'wb') as f:
+                    async for chunk in response.aiter_bytes(chunk_size=65536):
+                        f.write(chunk)
+                        metrics.inc("downloaded_bytes_total", len(chunk), client="httpx")
+            os.replace(part_path, path)
+            print(f"   - Downloaded media: {filename}")
+            return await asyncio.to_thread(self.media_cache.add, filename, path)
+        except Exception as e:
+            print(f"Error downloading {url}: {e}")
+            return None
+
+    def _pexels_request(self, query):
+        return {"headers": {"Authorization": PEXELS_API_KEY}, "params": {"query": query, "per_page": 15, "orientation": "portrait"}}
+
+    def _search_results(self, res, query):
+        """Returns (videos, query to retry with or None) from a Pexels search response."""
+        res.raise_for_status()
+        videos = res.json().get('videos', [])
+        if videos:
+            return videos, None
+        print(f"   - No videos found for query '{query}', trying fallback 'abstract technology'.")
+        return [], None if query == "abstract technology" else "abstract technology" # Prevent infinite recursion
+
+    def _pick_video(self, videos):
+        """Returns (video_url, credit, filename, start). With MOTION_ANALYSIS every search result's smallest
+        rendition is scored from a low-res proxy and the best window wins; otherwise a random video from 0s."""
+        video, start = random.choice(videos), 0.0
+        if MOTION_ANALYSIS:
+            from motion_analysis import rank_candidates
+            candidates = [v for v in videos if v.get('video_files')]
+            ranked = rank_candidates([(f"pexels_{v['id']}", pick_proxy_rendition(v['video_files'])['link']) for v in candidates])
+            if ranked:
+                score, start, index = ranked[0]
+                video = candidates[index]
+                print(f"   - Best of {len(ranked)} clips: pexels_{video['id']} from {start:.0f}s (motion score {score:.3f})")
+        video_url = pick_rendition(video['video_files'], REEL_WIDTH, REEL_HEIGHT)['link']
+        credit = video['user']['name']
+        filename = f"pexels_{video['id']}.mp4"
+        return video_url, credit, filename, start
+
+    def _get_cached_video(self):
+        """Picks an already indexed Pexels clip that is long enough, without touching the network."""
+        candidates = self.media_cache.find("pexels_", min_duration=REEL_DURATION_SECONDS)
+        if not candidates:
+            return None, None, 0.0
+        entry = random.choice(candidates)
+        print(f"   - Reusing cached video: {entry['key']}")
+        path = self.media_cache.lookup(entry['key'])
+        if path and MOTION_ANALYSIS:
+            from motion_analysis import best_start
+            return path, "Pexels", best_start(path, os.path.splitext(entry['key'])[0])
+        return path, "Pexels", 0.0
+
     def get_video(self, query):
+        """Returns (path, credit, start offset in seconds of the window to use)."""
         if not PEXELS_API_KEY:
-            print("   - PEXELS_API_KEY not found. Skipping video fetch.")
-            return None, None
-        headers = {"Authorization": PEXELS_API_KEY}
-        params = {"query": query, "per_page": 15, "orientation": "portrait"}
+            print("   - PEXELS_API_KEY not found. Trying cached videos.")
+            return self._get_cached_video()
         try:
-            res = requests.get("https://api.pexels.com/videos/search", headers=headers, params=params)
-            res.raise_for_status()
-            videos = res.json().get('videos', [])
+            videos, fallback_query = self._search_results(self.downloads.get(PEXELS_SEARCH_URL, **self._pexels_request(query)), query)
             if not videos:
-                print(f"   - No videos found for query '{query}', trying fallback 'abstract technology'.")
-                if query == "abstract technology": return None, None # Prevent infinite recursion
-                return self.get_video("abstract technology")
-
-            video = random.choice(videos)
-            video_url = random.choice(video['video_files'])['link']
-            credit = video['user']['name']
-            filename = f"pexels_{video['id']}.mp4"
-            
-            return self._download_file(video_url, filename), credit
+                return self.get_video(fallback_query) if fallback_query else (None, None, 0.0)
+
+            video_url, credit, filename, start = self._pick_video(videos)
+            return self._download_file(video_url, filename), credit, start
         except Exception as e:
             print(f"Error fetching video from Pexels: {e}")
-            return None, None
+            return self._get_cached_video()
 
     def _get_local_music(self):
         """Picks a random music file from the local 'audio' directory as a fallback."""
         print("   - Attempting to fetch music from local 'audio' folder...")
         try:
-            music_files = [f for f in os.listdir("audio") if f.endswith((".mp3", ".wav"))] # <-- CHANGED
+            music_files = AudioLibrary().list_tracks("audio")
             if not music_files:
                 print("   -> Error: The 'audio' folder is empty. No fallback music available.")
                 return None, None
@@ -68,28 +137,36 @@ class MediaFetcher:
             print(f"Error reading from local audio folder: {e}")
             return None, None
             
+    def _jamendo_params(self):
+        return {
+            "client_id": JAMENDO_CLIENT_ID,
+            "format": "json",
+            "limit": 50,
+            "tags": "electronic,ambient,tech,corporate,future",
+            "order": "popularity_month"
+        }
+
+    def _pick_track(self, res):
+        """Returns (music_url, credit, filename) for a random track of a Jamendo response, or None if it has none."""
+        res.raise_for_status()
+        tracks = res.json().get('results', [])
+        if not tracks:
+            return None
+        track = random.choice(tracks)
+        music_url = track.get('audio', '')
+        credit = track.get('artist_name', 'Jamendo Artist')
+        filename = f"jamendo_{track['id']}.mp3"
+        return music_url, credit, filename
+
     def _get_jamendo_music(self):
         """Fetches music from the Jamendo API."""
         if not JAMENDO_CLIENT_ID: return None, None
         print("   - Attempting to fetch music from Jamendo API...")
         try:
-            params = {
-                "client_id": JAMENDO_CLIENT_ID,
-                "format": "json",
-                "limit": 50,
-                "tags": "electronic,ambient,tech,corporate,future",
-                "order": "popularity_month"
-            }
-            res = requests.get("https://api.jamendo.com/v3.0/tracks/", params=params, timeout=10)
-            res.raise_for_status()
-            tracks = res.json().get('results', [])
-            if not tracks: return None, None
-
-            track = random.choice(tracks)
-            music_url = track.get('audio', '')
-            credit = track.get('artist_name', 'Jamendo Artist')
-            filename = f"jamendo_{track['id']}.mp3"
+            track = self._pick_track(self.downloads.get(JAMENDO_TRACKS_URL, params=self._jamendo_params(), timeout=10))
+            if not track: return None, None
 
+            music_url, credit, filename = track
             return self._download_file(music_url, filename), credit
         except Exception as e:
             print(f"   -> Error fetching music from Jamendo: {e}")
@@ -105,3 +182,42 @@ class MediaFetcher:
         # Step 2: Fallback to Local Folder
         print("-> Jamendo API failed or returned no results. Falling back to local music folder.")
         return self._get_local_music()
+
+    # --- Async variants used by the concurrent pipeline ---
+    async def get_video_async(self, query, http_client):
+        if not PEXELS_API_KEY:
+            print("   - PEXELS_API_KEY not found. Trying cached videos.")
+            return await asyncio.to_thread(self._get_cached_video)
+        try:
+            res = await http_client.get(PEXELS_SEARCH_URL, timeout=15, **self._pexels_request(query))
+            videos, fallback_query = self._search_results(res, query)
+            if not videos:
+                return await self.get_video_async(fallback_query, http_client) if fallback_query else (None, None, 0.0)
+
+            # Candidate scoring runs ffmpeg subprocesses, so it stays off the event loop.
+            video_url, credit, filename, start = await asyncio.to_thread(self._pick_video, videos)
+            return await self._download_file_async(video_url, filename, http_client), credit, start
+        except Exception as e:
+            print(f"Error fetching video from Pexels: {e}")
+            return await asyncio.to_thread(self._get_cached_video)
+
+    async def _get_jamendo_music_async(self, http_client):
+        if not JAMENDO_CLIENT_ID: return None, None
+        print("   - Attempting to fetch music from Jamendo API...")
+        try:
+            track = self._pick_track(await http_client.get(JAMENDO_TRACKS_URL, params=self._jamendo_params(), timeout=10))
+            if not track: return None, None
+
+            music_url, credit, filename = track
+            return await self._download_file_async(music_url, filename, http_client), credit
+        except Exception as e:
+            print(f"   -> Error fetching music from Jamendo: {e}")
+            return None, None
+
+    async def get_music_async(self, http_client, query=None):
+        music_path, credit = await self._get_jamendo_music_async(http_client)
+        if music_path:
+            return music_path, credit
+
+        print("-> Jamendo API failed or returned no results. Falling back to local music folder.")
+        return self._get_local_music()
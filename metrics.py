@@ -0,0 +1,192 @@
+# metrics.py
+# Lightweight run instrumentation: timed spans per pipeline stage and labelled counters, written as
+# a structured JSON event log and a Prometheus text-format file per run.
+#
+#   metrics.start_run()
+#   with metrics.span("fetch", category=category):
+#       ...
+#   metrics.inc("cache_hits_total", cache="feed")
+#   metrics.finish_run()
+#
+# Until start_run() is called everything is collected in memory only, so library code can
+# instrument freely without creating files (e.g. in the benchmarks).
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, UTC
+from config import METRICS_DIR, PROFILE_FRAMES
+from file_utils import atomic_write
+
+METRIC_PREFIX = "reel"
+METRIC_HELP = {
+    "stage_seconds": "Time spent per pipeline stage.",
+    "cache_hits_total": "Cache lookups served from cache.",
+    "cache_misses_total": "Cache lookups that had to do the work.",
+    "retries_total": "Retried network requests.",
+    "downloaded_bytes_total": "Bytes downloaded.",
+    "uploaded_bytes_total": "Bytes uploaded to Cloudinary.",
+    "frames_rendered_total": "Video frames sent to the encoder.",
+    "posts_total": "Posts by outcome.",
+}
+
+class RunMetrics:
+    def __init__(self, run_id=None, metrics_dir=None):
+        self.run_id = run_id or f"{datetime.now(UTC).strftime('%Y%m%dT%H%M%SZ')}_{uuid.uuid4().hex[:6]}"
+        self.metrics_dir = metrics_dir
+        self.started = time.time()
+        self.counters = {}  # (name, labels) -> value
+        self.timings = {}   # (stage, labels) -> [count, sum, max]
+        self._lock = threading.Lock()
+        self._log_file = None
+        if self.metrics_dir:
+            os.makedirs(self.metrics_dir, exist_ok=True)
+            # Append mode, so render worker processes can share the run's log.
+            self._log_file = open(os.path.join(self.metrics_dir, f"{self.run_id}.jsonl"), 'a', buffering=1)
+
+    def log(self, event, **fields):
+        if not self._log_file:
+            return
+        record = {"ts": datetime.now(UTC).isoformat(), "run_id": self.run_id, "pid": os.getpid(), "event": event, **fields}
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self._log_file.write(line + "\n")
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, stage, seconds, **labels):
+        key = (stage, tuple(sorted(labels.items())))
+        with self._lock:
+            timing = self.timings.setdefault(key, [0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+
+    @contextmanager
+    def span(self, stage, **labels):
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            yield
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            seconds = time.perf_counter() - started
+            self.observe(stage, seconds)
+            self.log("span", stage=stage, seconds=round(seconds, 6), status=status, **labels)
+
+    def snapshot(self):
+        """Picklable counters and timings, for merging results from worker processes."""
+        with self._lock:
+            return {"counters": list(self.counters.items()), "timings": [(key, list(value)) for key, value in self.timings.items()]}
+
+    def merge(self, snapshot):
+        with self._lock:
+            for key, value in snapshot['counters']:
+                key = (key[0], tuple(map(tuple, key[1])))
+                self.counters[key] = self.counters.get(key, 0) + value
+            for key, (count, total, longest) in snapshot['timings']:
+                key = (key[0], tuple(map(tuple, key[1])))
+                timing = self.timings.setdefault(key, [0, 0.0, 0.0])
+                timing[0] += count
+                timing[1] += total
+                timing[2] = max(timing[2], longest)
+
+    def to_prometheus(self):
+        def labels_text(labels):
+            if not labels:
+                return ""
+            escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+            return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+        lines = []
+        with self._lock:
+            name = f"{METRIC_PREFIX}_stage_seconds"
+            lines += [f"# HELP {name} {METRIC_HELP['stage_seconds']}", f"# TYPE {name} summary"]
+            for (stage, labels), (count, total, _) in sorted(self.timings.items()):
+                label_text = labels_text((("stage", stage),) + labels)
+                lines += [f"{name}_sum{label_text} {total:.6f}", f"{name}_count{label_text} {count}"]
+            lines += [f"# HELP {name}_max Longest single occurrence of a stage.", f"# TYPE {name}_max gauge"]
+            for (stage, labels), (_, _, longest) in sorted(self.timings.items()):
+                lines.append(f"{name}_max{labels_text((('stage', stage),) + labels)} {longest:.6f}")
+
+            for counter in sorted({key[0] for key in self.counters}):
+                name = f"{METRIC_PREFIX}_{counter}"
+                lines += [f"# HELP {name} {METRIC_HELP.get(counter, counter)}", f"# TYPE {name} counter"]
+                for (counter_name, labels), value in sorted(self.counters.items()):
+                    if counter_name == counter:
+                        lines.append(f"{name}{labels_text(labels)} {value}")
+
+        name = f"{METRIC_PREFIX}_run_duration_seconds"
+        lines += [f"# HELP {name} Wall time of the run.", f"# TYPE {name} gauge", f"{name} {time.time() - self.started:.3f}"]
+        name = f"{METRIC_PREFIX}_run_start_timestamp_seconds"
+        lines += [f"# HELP {name} Unix time the run started.", f"# TYPE {name} gauge", f"{name} {self.started:.3f}"]
+        return "\n".join(lines) + "\n"
+
+    def close(self):
+        if self._log_file:
+            self._log_file.close()
+            self._log_file = None
+
+    def write(self):
+        """Writes <run_id>.prom next to the event log and closes the log. Returns the .prom path, or None."""
+        if not self.metrics_dir:
+            return None
+        self.log("run_end", seconds=round(time.time() - self.started, 3),
+                 stages={stage: round(total, 6) for (stage, _), (_, total, _) in self.timings.items()})
+        path = os.path.join(self.metrics_dir, f"{self.run_id}.prom")
+        with atomic_write(path) as f:
+            f.write(self.to_prometheus())
+        self.close()
+        return path
+
+_current = RunMetrics()
+
+def current():
+    return _current
+
+def start_run(run_id=None, metrics_dir=METRICS_DIR, profile_frames=PROFILE_FRAMES):
+    """Starts collecting for a new run. Worker processes pass the parent's run_id to share its event log."""
+    global _current
+    _current.close()
+    _current = RunMetrics(run_id, metrics_dir or None)
+    # compositor pulls in numpy, so it's only imported when profiling or already loaded.
+    if profile_frames or 'compositor' in sys.modules:
+        import compositor
+        compositor.set_frame_hook(_record_frame if profile_frames else None)
+    if run_id is None:
+        _current.log("run_start")
+    return _current
+
+def finish_run():
+    path = _current.write()
+    if path:
+        print(f"-> Metrics written to {path}")
+    return path
+
+def _record_frame(t, layer_count, seconds):
+    _current.observe("compose_frame", seconds)
+    _current.log("frame", t=round(t, 4), layers=layer_count, seconds=round(seconds, 6))
+
+def span(stage, **labels):
+    return _current.span(stage, **labels)
+
+def inc(name, value=1, **labels):
+    _current.inc(name, value, **labels)
+
+def observe(stage, seconds, **labels):
+    _current.observe(stage, seconds, **labels)
+
+def log(event, **fields):
+    _current.log(event, **fields)
+
+def cache_lookup(cache, hit):
+    """Counts one lookup against `cache`."""
+    _current.inc("cache_hits_total" if hit else "cache_misses_total", cache=cache)
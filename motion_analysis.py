@@ -0,0 +1,116 @@
+# motion_analysis.py
+# Scores stock clips from a tiny grayscale proxy (a few fps, reel-cropped, ~72x128) decoded by ffmpeg,
+# so the best candidate and the best window are chosen before any full-resolution decode.
+# Per-second motion and scene-cut scores are cached per source id in MOTION_CACHE_DIR.
+import json
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from config import (MOTION_CACHE_DIR, MOTION_PROXY_WIDTH, MOTION_PROXY_HEIGHT, MOTION_PROXY_FPS, MOTION_MAX_SECONDS,
+                    MOTION_CUT_THRESHOLD, MOTION_ANALYSIS_WORKERS, REEL_DURATION_SECONDS)
+from encoder import get_ffmpeg_exe, crop_scale_filter
+from file_utils import write_json
+import metrics
+
+HISTOGRAM_BINS = 16
+
+def decode_proxy(source, width=MOTION_PROXY_WIDTH, height=MOTION_PROXY_HEIGHT, fps=MOTION_PROXY_FPS, max_seconds=MOTION_MAX_SECONDS):
+    """(frames, height, width) uint8 array of gray frames. `source` can be a local path or an http(s) URL."""
+    cmd = [get_ffmpeg_exe(), "-loglevel", "error", "-t", f"{max_seconds:.3f}", "-i", source, "-an", "-sn",
+           "-vf", f"fps={fps},{crop_scale_filter(width, height)},format=gray", "-f", "rawvideo", "-"]
+    try:
+        raw = subprocess.run(cmd, check=True, capture_output=True, timeout=120).stdout
+    except subprocess.CalledProcessError as e:
+        raise IOError(f"ffmpeg failed to decode a proxy of {source}: {e.stderr.decode(errors='replace').strip()[-300:]}")
+    return np.frombuffer(raw, dtype=np.uint8)[:len(raw) // (width * height) * width * height].reshape(-1, height, width)
+
+def score_frames(frames, fps=MOTION_PROXY_FPS):
+    """Per-second motion energy and scene-cut scores for a proxy clip.
+
+    Motion is the mean absolute difference between consecutive frames (0-1); cut is the largest
+    histogram distance (0-1) between consecutive frames. Cut transitions don't count as motion.
+    """
+    count = len(frames)
+    seconds = int(np.ceil(count / fps)) if count else 0
+    if count < 2:
+        return {"seconds": seconds, "motion": [0.0] * seconds, "cuts": [0.0] * seconds}
+
+    flat = frames.reshape(count, -1)
+    difference = np.abs(np.diff(flat.astype(np.int16), axis=0)).mean(axis=1) / 255.0
+
+    # One bincount for every frame's histogram: frame i's bins are offset by i * HISTOGRAM_BINS.
+    bins = (flat >> (8 - int(np.log2(HISTOGRAM_BINS)))).astype(np.int64) + np.arange(count)[:, None] * HISTOGRAM_BINS
+    histograms = np.bincount(bins.ravel(), minlength=count * HISTOGRAM_BINS).reshape(count, HISTOGRAM_BINS) / flat.shape[1]
+    cut = np.abs(np.diff(histograms, axis=0)).sum(axis=1) / 2
+
+    # Transition i -> i+1 belongs to the second frame i+1 is in.
+    second = (np.arange(1, count) // fps).astype(np.int64)
+    steady = cut < MOTION_CUT_THRESHOLD
+    motion_sum = np.bincount(second, weights=np.where(steady, difference, 0.0), minlength=seconds)
+    motion_count = np.bincount(second, weights=steady, minlength=seconds)
+    motion = np.divide(motion_sum, motion_count, out=np.zeros(seconds), where=motion_count > 0)
+    cuts = np.zeros(seconds)
+    np.maximum.at(cuts, second, cut)
+    return {"seconds": seconds, "motion": motion.round(5).tolist(), "cuts": cuts.round(4).tolist()}
+
+def best_window(analysis, duration=REEL_DURATION_SECONDS):
+    """Returns (start second, score) of the best `duration`-long window.
+
+    A window scores its mean motion, averaged with the motion of its first second so static openings lose,
+    and is halved for every scene cut inside it (starting right on a cut is fine). Clips shorter than
+    `duration` are scored on what they have, scaled by how much of the reel they can fill.
+    """
+    motion, cuts = np.asarray(analysis['motion']), np.asarray(analysis['cuts'])
+    seconds, window = len(motion), max(1, int(np.ceil(duration)))
+    if not seconds:
+        return 0.0, 0.0
+    if seconds <= window:
+        inside_cuts = int((cuts[1:] >= MOTION_CUT_THRESHOLD).sum())
+        score = (motion.mean() + motion[0]) / 2 * 0.5 ** inside_cuts * seconds / window
+        return 0.0, float(score)
+
+    # Sliding sums over every possible start.
+    motion_sums = np.convolve(motion, np.ones(window), mode='valid')
+    is_cut = (cuts >= MOTION_CUT_THRESHOLD).astype(np.int64)
+    inside_cuts = np.convolve(is_cut, np.ones(window, dtype=np.int64), mode='valid') - is_cut[:len(motion_sums)]
+    scores = (motion_sums / window + motion[:len(motion_sums)]) / 2 * 0.5 ** inside_cuts
+    start = int(np.argmax(scores))
+    return float(start), float(scores[start])
+
+def _cache_path(source_id):
+    return os.path.join(MOTION_CACHE_DIR, f"{source_id}.json")
+
+def analyze(source, source_id):
+    """Cached per-second scores for `source`, or None if it can't be decoded."""
+    path = _cache_path(source_id)
+    try:
+        with open(path, 'r') as f:
+            analysis = json.load(f)
+        os.utime(path) # The media cache prunes this folder by modification time
+        metrics.cache_lookup("motion", True)
+        return analysis
+    except (OSError, ValueError):
+        metrics.cache_lookup("motion", False)
+
+    try:
+        with metrics.span("motion_analysis", source_id=source_id):
+            analysis = dict(score_frames(decode_proxy(source)), source_id=source_id, fps=MOTION_PROXY_FPS)
+    except Exception as e:
+        print(f"   - Could not analyze motion of {source_id}: {e}")
+        return None
+    write_json(path, analysis)
+    return analysis
+
+def rank_candidates(candidates, duration=REEL_DURATION_SECONDS):
+    """Scores (source_id, source) pairs in parallel. Returns [(score, start, index)] best first; undecodable ones are left out."""
+    with ThreadPoolExecutor(max_workers=MOTION_ANALYSIS_WORKERS) as executor:
+        analyses = list(executor.map(lambda candidate: analyze(candidate[1], candidate[0]), candidates))
+    ranked = [(score, start, index) for index, analysis in enumerate(analyses) if analysis
+              for start, score in [best_window(analysis, duration)]]
+    return sorted(ranked, key=lambda item: item[0], reverse=True)
+
+def best_start(source, source_id, duration=REEL_DURATION_SECONDS):
+    """Start offset in seconds of the best window of one clip, 0.0 if it can't be analyzed."""
+    analysis = analyze(source, source_id)
+    return best_window(analysis, duration)[0] if analysis else 0.0
@@ -0,0 +1,67 @@
+# post_store.py
+import os
+from config import POSTS_DB_FILE, ALL_POSTS_EXCEL_FILE
+from file_utils import sqlite_connection
+
+POST_COLUMNS = {
+    "Post_ID": "TEXT",
+    "Category": "TEXT",
+    "Story_Style": "TEXT",
+    "Editing_Style": "TEXT",
+    "Hook": "TEXT",
+    "Caption": "TEXT",
+    "Hashtags": "TEXT",
+    "Timestamp": "TEXT",
+    "Views": "INTEGER",
+    "Likes": "INTEGER",
+    "Comments": "INTEGER",
+    "Shares": "INTEGER",
+}
+
+class PostStore:
+    """Append-only SQLite store for post history. Each post is a single INSERT in its own transaction."""
+    def __init__(self, db_file=POSTS_DB_FILE):
+        self.db_file = db_file
+        os.makedirs(os.path.dirname(self.db_file), exist_ok=True)
+        is_new = not os.path.exists(self.db_file)
+        with self._connect() as conn:
+            columns = ", ".join(f'"{name}" {sql_type}' for name, sql_type in POST_COLUMNS.items())
+            conn.execute(f"CREATE TABLE IF NOT EXISTS posts (id INTEGER PRIMARY KEY AUTOINCREMENT, {columns})")
+        if is_new and os.path.exists(ALL_POSTS_EXCEL_FILE):
+            self._import_excel(ALL_POSTS_EXCEL_FILE)
+
+    def _connect(self):
+        return sqlite_connection(self.db_file)
+
+    def _import_excel(self, excel_file):
+        """One-time migration of the legacy all_posts.xlsx history."""
+        import pandas as pd
+        df = pd.read_excel(excel_file)
+        df = df.reindex(columns=list(POST_COLUMNS))
+        rows = df.astype(object).where(df.notna(), None)
+        self._insert_many(rows.itertuples(index=False, name=None))
+        print(f"-> Imported {len(df)} posts from {excel_file} into {self.db_file}")
+
+    def _insert_many(self, rows):
+        placeholders = ", ".join("?" for _ in POST_COLUMNS)
+        column_names = ", ".join(f'"{name}"' for name in POST_COLUMNS)
+        with self._connect() as conn:
+            conn.executemany(f"INSERT INTO posts ({column_names}) VALUES ({placeholders})", rows)
+
+    def append(self, post):
+        self._insert_many([tuple(post.get(name) for name in POST_COLUMNS)])
+
+    def count(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM posts").fetchone()[0]
+
+    def read_dataframe(self):
+        import pandas as pd
+        column_names = ", ".join(f'"{name}"' for name in POST_COLUMNS)
+        with self._connect() as conn:
+            return pd.read_sql_query(f"SELECT {column_names} FROM posts ORDER BY id", conn)
+
+    def export_excel(self, excel_file=ALL_POSTS_EXCEL_FILE):
+        df = self.read_dataframe()
+        df.to_excel(excel_file, index=False)
+        return len(df)
@@ -0,0 +1,100 @@
+# preflight.py
+# Fast environment checks run before a post is attempted. Only config and the standard library
+# are imported up front, so a run that is going to fail bails out in milliseconds.
+import os
+import shutil
+import subprocess
+from config import OPENROUTER_API_KEY, PEXELS_API_KEY, JAMENDO_CLIENT_ID, EDITING_STYLES, LOGO_PATH, OUTPUT_DIR_VIDEO, OUTPUT_DIR_DATA
+
+LOCAL_MUSIC_DIR = "audio"
+
+def _check_keys():
+    problems, warnings = [], []
+    if not OPENROUTER_API_KEY or "sk-or-v1" not in OPENROUTER_API_KEY:
+        problems.append("OPENROUTER_API_KEY is missing or invalid")
+    if not PEXELS_API_KEY:
+        warnings.append("PEXELS_API_KEY is not set, only cached videos can be used")
+    if not JAMENDO_CLIENT_ID:
+        warnings.append(f"JAMENDO_CLIENT_ID is not set, music comes from '{LOCAL_MUSIC_DIR}/' only")
+    return problems, warnings
+
+def _check_fonts():
+    from PIL import ImageFont
+    problems = []
+    for font_path in sorted({style[key] for style in EDITING_STYLES.values() for key in ('font_hook', 'font_revelation')}):
+        try:
+            ImageFont.truetype(font_path, 10)
+        except Exception as e:
+            problems.append(f"Font {font_path} can't be loaded: {e}")
+    return problems, []
+
+def _check_logo():
+    from PIL import Image
+    try:
+        with Image.open(LOGO_PATH) as logo:
+            logo.verify()
+        return [], []
+    except Exception as e:
+        return [f"Logo {LOGO_PATH} can't be read: {e}"], []
+
+def _check_music():
+    tracks = [f for f in os.listdir(LOCAL_MUSIC_DIR) if f.endswith((".mp3", ".wav"))] if os.path.isdir(LOCAL_MUSIC_DIR) else []
+    if tracks:
+        from audio_library import AudioLibrary
+        unindexed = AudioLibrary().unindexed_tracks(LOCAL_MUSIC_DIR)
+        if unindexed:
+            return [], [f"{len(unindexed)} track(s) not in the music index yet, run 'python audio_library.py build'"]
+        return [], []
+    message = f"No .mp3/.wav tracks in '{LOCAL_MUSIC_DIR}/'"
+    # Without Jamendo the local folder is the only music source.
+    return ([message], []) if not JAMENDO_CLIENT_ID else ([], [f"{message}, there is no fallback if Jamendo fails"])
+
+def _check_ffmpeg():
+    from encoder import get_ffmpeg_exe
+    ffmpeg = get_ffmpeg_exe()
+    if not (os.path.isfile(ffmpeg) or shutil.which(ffmpeg)):
+        return [f"ffmpeg not found ({ffmpeg})"], []
+    try:
+        subprocess.run([ffmpeg, "-hide_banner", "-version"], check=True, capture_output=True, timeout=5)
+    except Exception as e:
+        return [f"ffmpeg at {ffmpeg} doesn't run: {e}"], []
+    return [], []
+
+def _check_output_dirs():
+    problems = []
+    for directory in (OUTPUT_DIR_VIDEO, OUTPUT_DIR_DATA):
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError as e:
+            problems.append(f"Can't create {directory}: {e}")
+            continue
+        if not os.access(directory, os.W_OK):
+            problems.append(f"{directory} is not writable")
+    return problems, []
+
+CHECKS = {
+    "API keys": _check_keys,
+    "Fonts": _check_fonts,
+    "Logo": _check_logo,
+    "Music": _check_music,
+    "ffmpeg": _check_ffmpeg,
+    "Output folders": _check_output_dirs,
+}
+
+def run_preflight(verbose=True):
+    """Runs every check and prints the results. Returns False if any check failed (warnings don't count)."""
+    ok = True
+    if verbose:
+        print("🔎 Running preflight checks...")
+    for name, check in CHECKS.items():
+        problems, warnings = check()
+        ok = ok and not problems
+        if verbose and not problems and not warnings:
+            print(f"   - {name}: OK")
+        for problem in problems:
+            print(f"   - {name}: FAILED - {problem}")
+        for warning in warnings if verbose else []:
+            print(f"   - {name}: WARNING - {warning}")
+    if verbose:
+        print("✅ Preflight passed." if ok else "❌ Preflight failed.")
+    return ok
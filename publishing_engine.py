@@ -1,23 +1,220 @@
 # publishing_engine.py
-# This file contains placeholders for actual publishing logic.
+# Uploads finished reels to Cloudinary and posts them to Instagram through the Graph API.
+# Uploads are chunked and resumable; container status polling is async, so many reels can
+# wait on Instagram's processing at once without holding a thread each.
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+import requests
+from config import (CLOUDINARY_CLOUD_NAME, CLOUDINARY_API_KEY, CLOUDINARY_API_SECRET, CLOUDINARY_API_BASE_URL,
+                    FB_PAGE_ACCESS_TOKEN, INSTAGRAM_BUSINESS_ACCOUNT_ID, INSTAGRAM_GRAPH_URL,
+                    UPLOAD_CHUNK_SIZE, UPLOAD_MAX_ATTEMPTS, PUBLISH_MAX_UPLOADS,
+                    PUBLISH_POLL_INITIAL_SECONDS, PUBLISH_POLL_MAX_SECONDS, PUBLISH_TIMEOUT_SECONDS)
+from file_utils import write_json
+import metrics
 
 class CloudinaryUploader:
+    """Chunked upload with Content-Range + X-Unique-Upload-Id. Progress is kept in `<video>.upload.json`,
+    so an interrupted upload continues from the last acknowledged chunk on the next call."""
+    def __init__(self, base_url=CLOUDINARY_API_BASE_URL, chunk_size=UPLOAD_CHUNK_SIZE):
+        self.upload_url = f"{base_url.rstrip('/')}/{CLOUDINARY_CLOUD_NAME}/video/upload"
+        self.chunk_size = chunk_size
+        self.session = requests.Session()
+
+    def _signed_params(self, public_id):
+        params = {"public_id": public_id, "timestamp": int(time.time())}
+        payload = "&".join(f"{key}={value}" for key, value in sorted(params.items()))
+        params['signature'] = hashlib.sha1((payload + CLOUDINARY_API_SECRET).encode()).hexdigest()
+        params['api_key'] = CLOUDINARY_API_KEY
+        return params
+
+    def _progress_path(self, video_path):
+        return f"{video_path}.upload.json"
+
+    def _load_progress(self, video_path, public_id):
+        """The saved upload for this exact file and public_id, or a fresh one."""
+        stat = os.stat(video_path)
+        fresh = {"upload_id": uuid.uuid4().hex, "public_id": public_id, "size": stat.st_size, "mtime": stat.st_mtime, "offset": 0}
+        try:
+            with open(self._progress_path(video_path), 'r') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return fresh
+        same_file = all(saved.get(key) == fresh[key] for key in ("public_id", "size", "mtime"))
+        return saved if same_file else fresh
+
+    def _save_progress(self, video_path, progress):
+        write_json(self._progress_path(video_path), progress)
+
+    def _send_chunk(self, progress, chunk, offset):
+        headers = {
+            "X-Unique-Upload-Id": progress['upload_id'],
+            "Content-Range": f"bytes {offset}-{offset + len(chunk) - 1}/{progress['size']}"
+        }
+        for attempt in range(UPLOAD_MAX_ATTEMPTS):
+            try:
+                response = self.session.post(self.upload_url, data=self._signed_params(progress['public_id']),
+                                             files={"file": ("chunk", chunk)}, headers=headers, timeout=120)
+                if response.status_code < 500 and response.status_code != 429:
+                    response.raise_for_status()
+                    return response.json()
+                error = f"HTTP {response.status_code}"
+            except requests.HTTPError:
+                raise
+            except requests.RequestException as e:
+                error = e
+            if attempt == UPLOAD_MAX_ATTEMPTS - 1:
+                raise IOError(f"Chunk at {offset} failed after {UPLOAD_MAX_ATTEMPTS} attempts: {error}")
+            delay = random.uniform(0, 2 ** attempt)
+            print(f"   - Upload chunk at {offset} failed ({error}), retrying in {delay:.1f}s")
+            metrics.inc("retries_total", component="upload")
+            time.sleep(delay)
+
     def upload_video(self, video_path, public_id):
-        print(f"--- SIMULATING UPLOAD ---")
-        print(f"Uploading {video_path} to Cloudinary with public_id: {public_id}")
-        # In a real scenario, use the cloudinary library here.
-        # import cloudinary.uploader
-        # result = cloudinary.uploader.upload(video_path, resource_type="video", public_id=public_id)
-        # return result.get('secure_url')
-        print("--- UPLOAD SUCCESS (SIMULATED) ---")
-        return f"http://fake.cloudinary.com/{public_id}.mp4"
+        """Returns the secure URL of the uploaded video, or None on failure (progress is kept for a retry)."""
+        if not (CLOUDINARY_CLOUD_NAME and CLOUDINARY_API_KEY and CLOUDINARY_API_SECRET):
+            print("-> Cloudinary credentials are missing, skipping upload.")
+            return None
+        try:
+            progress = self._load_progress(video_path, public_id)
+            if progress['offset']:
+                print(f"   - Resuming upload of {public_id} at {progress['offset']} of {progress['size']} bytes")
+            with open(video_path, 'rb') as f:
+                while True:
+                    offset = progress['offset']
+                    f.seek(offset)
+                    chunk = f.read(self.chunk_size)
+                    result = self._send_chunk(progress, chunk, offset)
+                    metrics.inc("uploaded_bytes_total", len(chunk))
+                    progress['offset'] = offset + len(chunk)
+                    if progress['offset'] >= progress['size']:
+                        break
+                    self._save_progress(video_path, progress)
+            if os.path.exists(self._progress_path(video_path)):
+                os.remove(self._progress_path(video_path))
+            print(f"   - Uploaded {public_id} to Cloudinary")
+            return result.get('secure_url')
+        except Exception as e:
+            print(f"Error uploading {video_path} to Cloudinary: {e}")
+            return None
 
 class InstagramPoster:
+    """Graph API reel flow: create a REELS container, poll until it has processed, then publish it."""
+    def __init__(self, graph_url=INSTAGRAM_GRAPH_URL):
+        self.graph_url = graph_url.rstrip('/')
+
+    async def _graph(self, client, method, path, **params):
+        params['access_token'] = FB_PAGE_ACCESS_TOKEN
+        url = f"{self.graph_url}/{path}"
+        if method == "GET":
+            response = await client.get(url, params=params, timeout=30)
+        else:
+            response = await client.post(url, data=params, timeout=30)
+        response.raise_for_status()
+        return response.json()
+
+    async def wait_until_ready(self, client, container_id):
+        """Polls the container with exponential backoff. True once FINISHED, False on ERROR/EXPIRED or timeout."""
+        delay = PUBLISH_POLL_INITIAL_SECONDS
+        deadline = time.monotonic() + PUBLISH_TIMEOUT_SECONDS
+        while time.monotonic() < deadline:
+            container = await self._graph(client, "GET", container_id, fields="status_code,status")
+            status_code = container.get('status_code')
+            if status_code == "FINISHED":
+                return True
+            if status_code in ("ERROR", "EXPIRED"):
+                print(f"-> Instagram could not process container {container_id}: {container.get('status')}")
+                return False
+            await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+            delay = min(delay * 1.5, PUBLISH_POLL_MAX_SECONDS)
+        print(f"-> Instagram container {container_id} was not ready after {PUBLISH_TIMEOUT_SECONDS}s")
+        return False
+
+    async def post_reel_async(self, video_url, caption, http_client=None):
+        """Returns the published media id, or None on failure."""
+        import httpx
+        if not (FB_PAGE_ACCESS_TOKEN and INSTAGRAM_BUSINESS_ACCOUNT_ID):
+            print("-> Instagram credentials are missing, skipping post.")
+            return None
+        try:
+            async with (nullcontext(http_client) if http_client else httpx.AsyncClient()) as client:
+                container = await self._graph(client, "POST", f"{INSTAGRAM_BUSINESS_ACCOUNT_ID}/media",
+                                              media_type="REELS", video_url=video_url, caption=caption)
+                if not await self.wait_until_ready(client, container['id']):
+                    return None
+                published = await self._graph(client, "POST", f"{INSTAGRAM_BUSINESS_ACCOUNT_ID}/media_publish", creation_id=container['id'])
+                return published.get('id')
+        except Exception as e:
+            print(f"Error posting reel to Instagram: {e}")
+            return None
+
     def post_reel(self, video_url, caption):
-        print(f"--- SIMULATING INSTAGRAM POST ---")
-        print(f"Posting reel to Instagram.")
-        print(f"Video URL: {video_url}")
-        print(f"Caption: {caption[:100]}...")
-        # In a real scenario, implement the multi-step Instagram Graph API reel posting process here.
-        print("--- POST SUCCESS (SIMULATED) ---")
-        return True
+        return asyncio.run(self.post_reel_async(video_url, caption)) is not None
+
+class Publisher:
+    """Publishes reels in the background so rendering never waits on the network.
+
+    Uploads share a bounded thread pool; container polling runs as coroutines on one event loop thread.
+        with Publisher() as publisher:
+            future = publisher.submit(video_path, public_id, caption)
+    """
+    def __init__(self, max_uploads=PUBLISH_MAX_UPLOADS):
+        import httpx
+        self.uploader = CloudinaryUploader()
+        self.poster = InstagramPoster()
+        self.upload_pool = ThreadPoolExecutor(max_workers=max_uploads, thread_name_prefix="upload")
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="publisher", daemon=True)
+        self.thread.start()
+        self.http_client = asyncio.run_coroutine_threadsafe(self._make_client(httpx), self.loop).result()
+        self.futures = []
+
+    async def _make_client(self, httpx):
+        return httpx.AsyncClient()
+
+    async def _publish(self, video_path, public_id, caption):
+        with metrics.span("upload", public_id=public_id):
+            video_url = await self.loop.run_in_executor(self.upload_pool, self.uploader.upload_video, video_path, public_id)
+        if not video_url:
+            metrics.inc("posts_total", status="publish_failed")
+            return None
+        with metrics.span("publish", public_id=public_id):
+            media_id = await self.poster.post_reel_async(video_url, caption, self.http_client)
+        if not media_id:
+            metrics.inc("posts_total", status="publish_failed")
+            return None
+        metrics.inc("posts_total", status="published")
+        print(f"📤 Published {public_id} to Instagram (media {media_id})")
+        return {"public_id": public_id, "video_url": video_url, "media_id": media_id}
+
+    def submit(self, video_path, public_id, caption):
+        """Queues a reel for upload + posting and returns a concurrent.futures.Future for its result dict (or None)."""
+        future = asyncio.run_coroutine_threadsafe(self._publish(video_path, public_id, caption), self.loop)
+        self.futures.append(future)
+        return future
+
+    def wait(self):
+        """Blocks until every submitted reel is done. Returns the result dicts (None for failures)."""
+        return [future.result() for future in self.futures]
+
+    def close(self):
+        results = self.wait()
+        asyncio.run_coroutine_threadsafe(self.http_client.aclose(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.upload_pool.shutdown()
+        return results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
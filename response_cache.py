@@ -0,0 +1,38 @@
+# response_cache.py
+import hashlib
+import json
+import os
+from config import AI_CACHE_DIR
+from file_utils import write_json
+import metrics
+
+class ResponseCache:
+    """Persistent LLM response cache keyed by a hash of model + messages + request params."""
+    def __init__(self, cache_dir=AI_CACHE_DIR):
+        self.cache_dir = cache_dir
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key(self, model, messages, params):
+        payload = json.dumps({"model": model, "messages": messages, "params": params}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'r') as f:
+                response = json.load(f)['response']
+        except Exception:
+            response = None
+        metrics.cache_lookup("ai", response is not None)
+        return response
+
+    def set(self, key, response):
+        if not self.cache_dir or response is None:
+            return
+        write_json(self._path(key), {"response": response})
@@ -0,0 +1,42 @@
+# source_cache.py
+# Normalizes stock footage once with ffmpeg (crop + scale inside the decode filter graph)
+# and caches the trimmed result in the media cache, so renders decode reel-sized frames only.
+import os
+import subprocess
+from config import NORMALIZED_MEDIA_DIR
+from encoder import get_ffmpeg_exe, crop_scale_filter
+from media_cache import MediaCache
+
+def normalized_source_path(video_path, size, duration, start=0.0):
+    """Cache key: source id + target geometry + trimmed window."""
+    source_id = os.path.splitext(os.path.basename(video_path))[0]
+    width, height = size
+    return os.path.join(NORMALIZED_MEDIA_DIR, f"{source_id}_{width}x{height}_{start:g}s+{duration:g}s.mp4")
+
+def normalize_source(video_path, size, duration, start=0.0):
+    """Returns a path to a center-cropped, scaled and trimmed copy of `video_path`."""
+    cache = MediaCache()
+    path = normalized_source_path(video_path, size, duration, start)
+    cache_key = f"normalized/{os.path.basename(path)}"
+    cached_path = cache.lookup(cache_key)
+    if cached_path:
+        print(f"   - Using normalized source: {os.path.basename(path)}")
+        return cached_path
+
+    os.makedirs(NORMALIZED_MEDIA_DIR, exist_ok=True)
+    # Crop to the target aspect ratio around the center, then scale, all before frames leave ffmpeg.
+    video_filter = crop_scale_filter(*size)
+    temp_path = f"{path}.{os.getpid()}.part"
+    cmd = [get_ffmpeg_exe(), "-y", "-loglevel", "error",
+           "-ss", f"{start:.3f}", "-t", f"{duration:.3f}", "-i", video_path,
+           "-an", "-vf", video_filter,
+           "-c:v", "libx264", "-preset", "ultrafast", "-crf", "14", "-pix_fmt", "yuv420p",
+           "-f", "mp4", temp_path]
+    try:
+        subprocess.run(cmd, check=True, capture_output=True)
+    except subprocess.CalledProcessError as e:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise IOError(f"ffmpeg failed to normalize {video_path}: {e.stderr.decode(errors='replace')}")
+    print(f"   - Normalized source cached: {os.path.basename(path)}")
+    return cache.add(cache_key, temp_path, source_id=os.path.splitext(os.path.basename(video_path))[0])
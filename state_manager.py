@@ -2,51 +2,164 @@
 import json
 import os
 import random
+from contextlib import contextmanager, nullcontext
 from datetime import datetime, timedelta, UTC
-from config import (STATE_FILE, CONTENT_SOURCES, STORYTELLING_STYLES, EDITING_STYLES, ANALYSIS_INTERVAL_DAYS, OUTPUT_DIR_DATA)
+from file_utils import file_lock, write_json
+from config import (STATE_FILE, CONTENT_SOURCES, STORYTELLING_STYLES, EDITING_STYLES, ANALYSIS_INTERVAL_DAYS, OUTPUT_DIR_DATA,
+                    ENGAGEMENT_WEIGHTS, STYLE_STATS_MIN_POSTS, STYLE_STATS_METRIC, STYLE_STATS_EWMA_ALPHA)
+
+# Post fields tracked by the running per-style statistics.
+STAT_DIMENSIONS = {"story": "Story_Style", "edit": "Editing_Style", "category": "Category"}
 
 class StateManager:
+    """state.json shared by every process using the data directory.
+
+    Changes go through _transaction(), which holds an exclusive lock on state.json.lock, re-reads
+    the file, applies the change and writes it back with an atomic rename.
+    """
     def __init__(self):
+        self._lock_depth = 0
         self.state = {
             "run_count": 0,
             "last_analysis_timestamp": None,
             "category_cycle_index": 0,
             "best_performing_story_style": random.choice(list(STORYTELLING_STYLES.keys())),
             "best_performing_edit_style": random.choice(list(EDITING_STYLES.keys())),
-            "last_story_key": None
+            "last_story_key": None,
+            "style_stats": {dimension: {} for dimension in STAT_DIMENSIONS},
+            "style_stats_seeded": False # Set once the post history has been imported into style_stats
         }
         self._load_state()
 
-    def _load_state(self):
-        if os.path.exists(STATE_FILE):
+    @contextmanager
+    def _locked(self):
+        """Exclusive cross-process lock on the state file. Re-entrant within this StateManager."""
+        with file_lock(f"{STATE_FILE}.lock") if self._lock_depth == 0 else nullcontext():
+            self._lock_depth += 1
             try:
-                with open(STATE_FILE, 'r') as f:
-                    self.state.update(json.load(f))
+                yield
+            finally:
+                self._lock_depth -= 1
+
+    def _read_state(self):
+        """Merges state.json into self.state. Returns False if there is no readable file."""
+        if not os.path.exists(STATE_FILE):
+            return False
+        try:
+            with open(STATE_FILE, 'r') as f:
+                self.state.update(json.load(f))
+            return True
+        except Exception as e:
+            print(f"Error loading state, using default. Error: {e}")
+            return False
+
+    def _load_state(self):
+        with self._locked():
+            if self._read_state():
                 print(f"-> State loaded. Run count: {self.state['run_count']}")
-            except Exception as e:
-                print(f"Error loading state, using default. Error: {e}")
-        else:
-            print("No state file found, initializing new state.")
-            self.state['last_analysis_timestamp'] = datetime.now(UTC).isoformat()
-            self._save_state()
+            elif not os.path.exists(STATE_FILE):
+                print("No state file found, initializing new state.")
+                self.state['last_analysis_timestamp'] = datetime.now(UTC).isoformat()
+                self._save_state()
+
+    def reload(self):
+        """Re-reads state.json, picking up changes made by other processes since this StateManager loaded it."""
+        with self._locked():
+            self._read_state()
 
     def _save_state(self):
-        os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
-        with open(STATE_FILE, 'w') as f:
-            json.dump(self.state, f, indent=4)
+        write_json(STATE_FILE, self.state, indent=4)
+
+    @contextmanager
+    def _transaction(self):
+        """Lock, re-read the latest state from disk, let the caller modify self.state, then save atomically."""
+        with self._locked():
+            if self._lock_depth == 1:
+                self._read_state()
+            yield self.state
+            self._save_state()
+
+    def record_post_metrics(self, post):
+        """O(1) update of the running count/sum/EWMA of engagement for the post's story style, edit style and category."""
+        score = sum(post[field] * weight for field, weight in ENGAGEMENT_WEIGHTS.items())
+        with self._transaction() as state:
+            for dimension, field in STAT_DIMENSIONS.items():
+                stats = state['style_stats'].setdefault(dimension, {}).setdefault(post[field], {"count": 0, "sum": 0.0, "ewma": score})
+                stats['count'] += 1
+                stats['sum'] += score
+                stats['ewma'] += STYLE_STATS_EWMA_ALPHA * (score - stats['ewma'])
+
+    def seed_style_stats(self, compute_style_stats):
+        """Replaces the running stats with compute_style_stats() (aggregates of the full post history), once.
+
+        It is called under the state lock, so no other process records a post in between. Returns False if
+        the stats were already seeded. compute_style_stats() may return None to keep the current stats.
+        """
+        with self._transaction() as state:
+            if state.get('style_stats_seeded'):
+                return False
+            style_stats = compute_style_stats()
+            if style_stats is not None:
+                state['style_stats'] = style_stats
+            state['style_stats_seeded'] = True
+            return True
+
+    def style_stats_seeded(self):
+        return bool(self.state.get('style_stats_seeded'))
+
+    def get_style_score(self, dimension, key):
+        stats = self.state['style_stats'].get(dimension, {}).get(key)
+        if not stats or not stats['count']:
+            return None
+        return stats['ewma'] if STYLE_STATS_METRIC == "ewma" else stats['sum'] / stats['count']
+
+    def _best_style(self, dimension, candidates, fallback):
+        stats = self.state['style_stats'].get(dimension, {})
+        scored = {key: self.get_style_score(dimension, key) for key in candidates if key in stats}
+        if sum(stats[key]['count'] for key in scored) < STYLE_STATS_MIN_POSTS:
+            return fallback
+        return max(scored, key=scored.get)
 
     def get_next_story_style(self):
         categories = list(CONTENT_SOURCES.keys())
         category = categories[self.state['category_cycle_index'] % len(categories)]
         
-        style_key = self.state['best_performing_story_style'] if random.random() < 0.7 else random.choice(list(STORYTELLING_STYLES.keys()))
+        best_story = self._best_style("story", STORYTELLING_STYLES, self.state['best_performing_story_style'])
+        style_key = best_story if random.random() < 0.7 else random.choice(list(STORYTELLING_STYLES.keys()))
         self.state['last_story_key'] = style_key
         return category, STORYTELLING_STYLES[style_key]
 
     def get_next_editing_style(self):
-        style_key = self.state['best_performing_edit_style'] if random.random() < 0.7 else random.choice(list(EDITING_STYLES.keys()))
+        best_edit = self._best_style("edit", EDITING_STYLES, self.state['best_performing_edit_style'])
+        style_key = best_edit if random.random() < 0.7 else random.choice(list(EDITING_STYLES.keys()))
         return style_key, EDITING_STYLES[style_key]
         
+    def get_next_plan(self):
+        category, story_style_prompt = self.get_next_story_style()
+        edit_style_key, edit_style_params = self.get_next_editing_style()
+        return {
+            "run_number": self.state['run_count'],
+            "category": category,
+            "story_key": self.state['last_story_key'],
+            "story_prompt": story_style_prompt,
+            "edit_key": edit_style_key,
+            "edit_params": edit_style_params
+        }
+
+    def reserve_next_slot(self):
+        """Atomically claims the next run: returns its plan (run number, category, styles) and advances
+        the counters, so concurrent processes never get the same post_id."""
+        with self._transaction() as state:
+            plan = self.get_next_plan()
+            state['run_count'] += 1
+            state['category_cycle_index'] += 1
+            return plan
+
+    def plan_posts(self, count):
+        """Reserves the next `count` runs up front so batch posts get unique run numbers."""
+        with self._transaction():
+            return [self.reserve_next_slot() for _ in range(count)]
+
     def get_last_story_key(self):
         return self.state.get('last_story_key')
 
@@ -56,16 +169,16 @@ class StateManager:
         return datetime.now(UTC) - last_time >= timedelta(days=ANALYSIS_INTERVAL_DAYS)
 
     def update_after_analysis(self, best_story, best_edit):
-        self.state['last_analysis_timestamp'] = datetime.now(UTC).isoformat()
-        self.state['best_performing_story_style'] = best_story
-        self.state['best_performing_edit_style'] = best_edit
-        self._save_state()
+        with self._transaction() as state:
+            state['last_analysis_timestamp'] = datetime.now(UTC).isoformat()
+            state['best_performing_story_style'] = best_story
+            state['best_performing_edit_style'] = best_edit
         print(f"-> State updated with best styles: Story='{best_story}', Edit='{best_edit}'")
 
     def increment_run_count(self):
-        self.state['run_count'] += 1
-        self.state['category_cycle_index'] += 1
-        self._save_state()
+        with self._transaction() as state:
+            state['run_count'] += 1
+            state['category_cycle_index'] += 1
         
     def get_run_count(self):
         return self.state['run_count']
@@ -0,0 +1,102 @@
+# tests/test_ai_scheduler.py
+import asyncio
+import json
+import time
+import pytest
+import ai_engine
+import metrics
+from ai_scheduler import AIRequestScheduler
+from response_cache import ResponseCache
+
+def completion(text):
+    return json.dumps({
+        "id": "cmpl-test", "object": "chat.completion", "created": 0, "model": "test",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+    })
+
+@pytest.fixture
+def ai_processor(monkeypatch, tmp_path):
+    def make(base_url):
+        monkeypatch.setattr(ai_engine, "OPENROUTER_API_KEY", "sk-or-v1-test")
+        monkeypatch.setattr(ai_engine, "OPENROUTER_BASE_URL", base_url)
+        processor = ai_engine.AIProcessor()
+        processor.cache = ResponseCache(str(tmp_path / "ai_cache"))
+        return processor
+    return make
+
+def fast_scheduler(processor):
+    """Installs a scheduler for the running loop whose token bucket refills fast, so only Retry-After sets the pace."""
+    processor._scheduler = (asyncio.get_running_loop(), AIRequestScheduler(processor, requests_per_minute=600))
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    metrics.start_run(metrics_dir="")
+
+def test_429_waits_for_retry_after_then_caches(stub_server, ai_processor):
+    statuses = iter([429, 429])
+
+    def respond(request):
+        status = next(statuses, 200)
+        if status == 429:
+            return 429, {"Content-Type": "application/json", "Retry-After": "0.3"}, '{"error": {"message": "rate limited"}}'
+        return 200, {"Content-Type": "application/json"}, completion("A hook")
+
+    server = stub_server(respond)
+    processor = ai_processor(server.url)
+    messages = [{"role": "user", "content": "Write a hook"}]
+
+    async def run():
+        fast_scheduler(processor)
+        started = time.monotonic()
+        first = await processor._make_request_async(messages)
+        elapsed = time.monotonic() - started
+        second = await processor._make_request_async(messages)
+        return first, second, elapsed, processor.scheduler.summary()
+
+    first, second, elapsed, summary = asyncio.run(run())
+    assert first == second == "A hook"
+    assert elapsed >= 0.6 # Both Retry-After waits were honoured
+    assert len(server.requests) == 3 # The second call was served from the cache
+    assert summary['retries'] == 2 and summary['succeeded'] == 1
+    counters = metrics.current().counters
+    assert counters[("retries_total", (("component", "ai"), ("status", 429)))] == 2
+    assert counters[("cache_hits_total", (("cache", "ai"),))] == 1
+
+def test_429_blocks_later_requests_until_retry_after(stub_server, ai_processor):
+    rate_limited = []
+
+    def respond(request):
+        request['at'] = time.monotonic()
+        if not rate_limited:
+            rate_limited.append(request['at'])
+            return 429, {"Content-Type": "application/json", "Retry-After": "0.5"}, '{"error": {"message": "rate limited"}}'
+        return 200, {"Content-Type": "application/json"}, completion(json.loads(request['body'])['messages'][0]['content'])
+
+    server = stub_server(respond)
+    processor = ai_processor(server.url)
+
+    async def later_request():
+        await asyncio.sleep(0.1) # Starts after the 429 came back
+        return await processor._make_request_async([{"role": "user", "content": "second"}])
+
+    async def run():
+        fast_scheduler(processor)
+        return await asyncio.gather(processor._make_request_async([{"role": "user", "content": "first"}]), later_request())
+
+    assert asyncio.run(run()) == ["first", "second"]
+    # The token bucket held both the retry and the unrelated request until Retry-After had passed.
+    assert len(server.requests) == 3
+    assert all(request['at'] - rate_limited[0] >= 0.45 for request in server.requests[1:])
+
+def test_non_retryable_error_is_not_retried_or_cached(stub_server, ai_processor):
+    server = stub_server(lambda request: (400, {"Content-Type": "application/json"}, '{"error": {"message": "bad request"}}'))
+    processor = ai_processor(server.url)
+    messages = [{"role": "user", "content": "Write a hook"}]
+
+    async def run():
+        fast_scheduler(processor)
+        return [await processor._make_request_async(messages) for _ in range(2)]
+
+    assert asyncio.run(run()) == [None, None]
+    assert len(server.requests) == 2 # One attempt per call, nothing cached
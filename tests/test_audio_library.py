@@ -0,0 +1,38 @@
+# tests/test_audio_library.py
+import subprocess
+import pytest
+import metrics
+from audio_library import AudioLibrary
+from encoder import get_ffmpeg_exe
+
+@pytest.fixture(autouse=True)
+def workspace(tmp_path, monkeypatch):
+    # build() also looks at Jamendo downloads in the media cache, which is relative to the working directory.
+    monkeypatch.chdir(tmp_path)
+    metrics.start_run(metrics_dir="")
+
+@pytest.fixture
+def music_dir(tmp_path):
+    folder = tmp_path / "audio"
+    folder.mkdir()
+    for index, frequency in enumerate((220, 440)):
+        subprocess.run([get_ffmpeg_exe(), "-loglevel", "error", "-f", "lavfi", "-i", f"sine=frequency={frequency}:duration=30",
+                        str(folder / f"track_{index}.mp3")], check=True)
+    return str(folder)
+
+def test_build_indexes_every_track_once(music_dir, tmp_path):
+    library = AudioLibrary(str(tmp_path / "index.json"))
+    assert library.build(music_dir, segment_duration=10, verbose=False) == 2
+    assert library.build(music_dir, segment_duration=10, verbose=False) == 0
+    assert AudioLibrary(str(tmp_path / "index.json")).unindexed_tracks(music_dir, segment_duration=10) == []
+
+def test_pick_segment_uses_the_built_index(music_dir, tmp_path, monkeypatch):
+    library = AudioLibrary(str(tmp_path / "index.json"))
+    library.build(music_dir, verbose=False)
+    monkeypatch.setattr(library, "analyze", lambda *args, **kwargs: pytest.fail("indexed track was decoded again"))
+    track = f"{music_dir}/track_0.mp3"
+    for _ in range(2):
+        start, gain = library.pick_segment(track, 8)
+        assert 0 <= start <= library.index['tracks'][track]['duration'] - 8
+        assert gain == library.index['tracks'][track]['gain']
+    assert metrics.current().counters[("cache_hits_total", (("cache", "audio_analysis"),))] == 2
@@ -0,0 +1,52 @@
+# tests/test_feed_cache.py
+import asyncio
+import httpx
+import pytest
+import metrics
+from feed_cache import FeedCache
+
+RSS = """<?xml version="1.0"?><rss version="2.0"><channel><title>Stub Feed</title>
+<item><title>First</title><link>https://example.com/1</link><description>One</description></item>
+<item><title>Second</title><link>https://example.com/2</link><description>Two</description></item>
+</channel></rss>"""
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    metrics.start_run(metrics_dir="")
+
+def feed_server(stub_server):
+    """Serves RSS with an ETag and answers 304 when the client already has it."""
+    def respond(request):
+        if request['headers'].get('If-None-Match') == '"v1"':
+            return 304, {"ETag": '"v1"'}, ""
+        return 200, {"Content-Type": "application/rss+xml", "ETag": '"v1"'}, RSS
+    return stub_server(respond)
+
+def feed_lookups():
+    counters = metrics.current().counters
+    return counters.get(("cache_hits_total", (("cache", "feed"),)), 0), counters.get(("cache_misses_total", (("cache", "feed"),)), 0)
+
+def fetch_sync(cache, url):
+    return cache.get_feed("Tech", url)
+
+def fetch_async(cache, url):
+    async def run():
+        async with httpx.AsyncClient() as client:
+            return await cache.get_feed_async("Tech", url, client)
+    return asyncio.run(run())
+
+@pytest.mark.parametrize("fetch", [fetch_sync, fetch_async])
+def test_conditional_get_revalidates_expired_feed(stub_server, tmp_path, fetch):
+    server = feed_server(stub_server)
+    feed = fetch(FeedCache(str(tmp_path), ttl_seconds=3600), f"{server.url}/rss")
+    assert [entry['title'] for entry in feed['entries']] == ["First", "Second"]
+    assert feed['etag'] == '"v1"'
+
+    # Within the TTL nothing is requested.
+    assert fetch(FeedCache(str(tmp_path), ttl_seconds=3600), f"{server.url}/rss")['entries'] == feed['entries']
+    assert len(server.requests) == 1
+
+    # Once expired, the cached copy is revalidated and a 304 keeps it.
+    assert fetch(FeedCache(str(tmp_path), ttl_seconds=0), f"{server.url}/rss")['entries'] == feed['entries']
+    assert server.requests[-1]['headers']['If-None-Match'] == '"v1"'
+    assert feed_lookups() == (2, 1)
@@ -0,0 +1,46 @@
+# tests/test_media_cache.py
+import os
+import time
+import pytest
+import metrics
+from media_cache import MediaCache, prune_dir
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    metrics.start_run(metrics_dir="")
+
+def write(path, size):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(os.urandom(size))
+    return str(path)
+
+def age(cache, key, seconds):
+    with cache._connect() as conn:
+        conn.execute("UPDATE media SET last_access = ? WHERE key = ?", (time.time() - seconds, key))
+
+def test_file_larger_than_the_budget_is_kept(tmp_path):
+    cache = MediaCache(str(tmp_path / "cache"), max_bytes=1000, derived_dirs=())
+    path = cache.add("pexels_1.mp4", write(tmp_path / "big.mp4", 5000))
+    assert os.path.exists(path)
+    assert cache.lookup("pexels_1.mp4") == path
+
+def test_eviction_skips_entries_in_use(tmp_path):
+    cache = MediaCache(str(tmp_path / "cache"), max_bytes=2500, derived_dirs=())
+    old = cache.add("pexels_1.mp4", write(tmp_path / "1.mp4", 1000))
+    rendering = cache.add("pexels_2.mp4", write(tmp_path / "2.mp4", 1000))
+    age(cache, "pexels_1.mp4", 2 * 3600)
+    new = cache.add("pexels_3.mp4", write(tmp_path / "3.mp4", 1000))
+
+    # Only the entry nobody touched within the grace window went.
+    assert not os.path.exists(old) and os.path.exists(rendering) and os.path.exists(new)
+    assert {entry['key'] for entry in cache.find()} == {"pexels_2.mp4", "pexels_3.mp4"}
+
+def test_prune_dir_drops_oldest_files_outside_the_grace_window(tmp_path):
+    directory = tmp_path / "motion"
+    paths = [write(directory / f"{index}.json", 100) for index in range(4)]
+    for index, path in enumerate(paths[:3]):
+        os.utime(path, (time.time() - 3600 * (10 - index),) * 2)
+
+    assert prune_dir(str(directory), max_bytes=150, grace_seconds=60) == 3
+    assert sorted(os.listdir(directory)) == ["3.json"]
@@ -0,0 +1,80 @@
+# tests/test_media_engine.py
+import asyncio
+import json
+import httpx
+import pytest
+import media_engine
+import metrics
+from media_engine import MediaFetcher
+
+VIDEO_BYTES = b"not really an mp4" * 64
+MUSIC_BYTES = b"not really an mp3" * 64
+
+@pytest.fixture(autouse=True)
+def workspace(tmp_path, monkeypatch):
+    # The media cache and the local audio folder are relative to the working directory.
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(media_engine, "PEXELS_API_KEY", "pexels-key")
+    monkeypatch.setattr(media_engine, "JAMENDO_CLIENT_ID", "jamendo-id")
+    monkeypatch.setattr(media_engine, "MOTION_ANALYSIS", False)
+    metrics.start_run(metrics_dir="")
+
+def media_server(stub_server, videos_for=lambda query: [7]):
+    """Pexels search, Jamendo tracks and the files they point to. `videos_for` maps a query to the video ids it finds."""
+    def respond(request):
+        path, _, query = request['path'].partition("?")
+        if path == "/pexels":
+            assert request['headers']['Authorization'] == "pexels-key"
+            search = httpx.QueryParams(query)['query']
+            videos = [{"id": video_id, "user": {"name": "Videographer"},
+                       "video_files": [{"link": f"{server.url}/files/video.mp4", "width": 1080, "height": 1920, "quality": "hd"}]}
+                      for video_id in videos_for(search)]
+            return 200, {"Content-Type": "application/json"}, json.dumps({"videos": videos})
+        if path == "/jamendo":
+            return 200, {"Content-Type": "application/json"}, json.dumps({"results": [
+                {"id": 9, "audio": f"{server.url}/files/track.mp3", "artist_name": "Musician"}]})
+        if path == "/files/video.mp4":
+            return 200, {"Content-Type": "video/mp4"}, VIDEO_BYTES
+        if path == "/files/track.mp3":
+            return 200, {"Content-Type": "audio/mpeg"}, MUSIC_BYTES
+        return 404, {}, ""
+    server = stub_server(respond)
+    return server
+
+@pytest.fixture
+def endpoints(monkeypatch):
+    def point_at(server):
+        monkeypatch.setattr(media_engine, "PEXELS_SEARCH_URL", f"{server.url}/pexels")
+        monkeypatch.setattr(media_engine, "JAMENDO_TRACKS_URL", f"{server.url}/jamendo")
+        return server
+    return point_at
+
+def fetch_sync(fetcher, query):
+    return fetcher.get_video(query), fetcher.get_music()
+
+def fetch_async(fetcher, query):
+    async def run():
+        async with httpx.AsyncClient() as client:
+            return await fetcher.get_video_async(query, client), await fetcher.get_music_async(client)
+    return asyncio.run(run())
+
+@pytest.mark.parametrize("fetch", [fetch_sync, fetch_async])
+def test_video_and_music_are_downloaded_into_the_cache(stub_server, endpoints, fetch):
+    endpoints(media_server(stub_server))
+    (video_path, video_credit, start), (music_path, music_credit) = fetch(MediaFetcher(), "abstract technology AI")
+
+    assert (video_credit, start, music_credit) == ("Videographer", 0.0, "Musician")
+    with open(video_path, 'rb') as f:
+        assert f.read() == VIDEO_BYTES
+    with open(music_path, 'rb') as f:
+        assert f.read() == MUSIC_BYTES
+    assert {entry['key'] for entry in MediaFetcher().media_cache.find()} == {"pexels_7.mp4", "jamendo_9.mp3"}
+
+@pytest.mark.parametrize("fetch", [fetch_sync, fetch_async])
+def test_empty_search_falls_back_to_the_generic_query(stub_server, endpoints, fetch):
+    server = endpoints(media_server(stub_server, videos_for=lambda query: [7] if query == "abstract technology" else []))
+    (video_path, video_credit, _), _ = fetch(MediaFetcher(), "abstract technology AI")
+
+    assert video_path and video_credit == "Videographer"
+    searches = [httpx.QueryParams(request['path'].partition("?")[2])['query'] for request in server.requests if request['path'].startswith("/pexels")]
+    assert searches == ["abstract technology AI", "abstract technology"]
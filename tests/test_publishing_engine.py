@@ -0,0 +1,139 @@
+# tests/test_publishing_engine.py
+import asyncio
+import json
+import os
+import re
+from email.parser import BytesParser
+from email.policy import HTTP
+import pytest
+import publishing_engine
+import metrics
+from publishing_engine import CloudinaryUploader, InstagramPoster
+
+CHUNK_SIZE = 1000
+
+def multipart_fields(request):
+    """Form fields of a multipart/form-data request body, as name -> bytes."""
+    message = BytesParser(policy=HTTP).parsebytes(
+        f"Content-Type: {request['headers']['Content-Type']}\r\n\r\n".encode() + request['body'])
+    return {part.get_param('name', header='content-disposition'): part.get_payload(decode=True) for part in message.iter_parts()}
+
+@pytest.fixture(autouse=True)
+def credentials(monkeypatch):
+    monkeypatch.setattr(publishing_engine, "CLOUDINARY_CLOUD_NAME", "demo")
+    monkeypatch.setattr(publishing_engine, "CLOUDINARY_API_KEY", "key")
+    monkeypatch.setattr(publishing_engine, "CLOUDINARY_API_SECRET", "secret")
+    monkeypatch.setattr(publishing_engine, "FB_PAGE_ACCESS_TOKEN", "token")
+    monkeypatch.setattr(publishing_engine, "INSTAGRAM_BUSINESS_ACCOUNT_ID", "1789")
+    monkeypatch.setattr(publishing_engine, "PUBLISH_POLL_INITIAL_SECONDS", 0.01)
+    monkeypatch.setattr(publishing_engine, "PUBLISH_POLL_MAX_SECONDS", 0.02)
+    metrics.start_run(metrics_dir="")
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / "reel.mp4"
+    path.write_bytes(os.urandom(CHUNK_SIZE * 3 + 250))
+    return str(path)
+
+class FakeCloudinary:
+    """Reassembles chunks by X-Unique-Upload-Id. `fail_at` maps a chunk's start offset to the status to answer once."""
+    def __init__(self, size, fail_at=None):
+        self.size = size
+        self.fail_at = dict(fail_at or {})
+        self.uploads = {}
+        self.ranges = []
+
+    def __call__(self, request):
+        assert request['path'] == "/demo/video/upload"
+        start, end, total = map(int, re.fullmatch(r"bytes (\d+)-(\d+)/(\d+)", request['headers']['Content-Range']).groups())
+        fields = multipart_fields(request)
+        assert fields['public_id'] == b"post_1" and fields['signature']
+        self.ranges.append((request['headers']['X-Unique-Upload-Id'], start, end))
+        if start in self.fail_at:
+            return self.fail_at.pop(start), {"Content-Type": "application/json"}, '{"error": {"message": "boom"}}'
+        assert total == self.size and end - start + 1 == len(fields['file'])
+        self.uploads.setdefault(request['headers']['X-Unique-Upload-Id'], {})[start] = fields['file']
+        body = {"done": False} if end + 1 < total else {"secure_url": "https://res.example/post_1.mp4"}
+        return 200, {"Content-Type": "application/json"}, json.dumps(body)
+
+    def assembled(self, upload_id):
+        chunks = self.uploads[upload_id]
+        return b"".join(chunks[offset] for offset in sorted(chunks))
+
+def test_chunked_upload_sends_content_ranges(stub_server, video):
+    cloudinary = FakeCloudinary(os.path.getsize(video))
+    server = stub_server(cloudinary)
+    url = CloudinaryUploader(server.url, CHUNK_SIZE).upload_video(video, "post_1")
+
+    assert url == "https://res.example/post_1.mp4"
+    assert [(start, end) for _, start, end in cloudinary.ranges] == [(0, 999), (1000, 1999), (2000, 2999), (3000, 3249)]
+    assert len({upload_id for upload_id, _, _ in cloudinary.ranges}) == 1
+    with open(video, 'rb') as f:
+        assert cloudinary.assembled(cloudinary.ranges[0][0]) == f.read()
+    assert not os.path.exists(f"{video}.upload.json")
+
+def test_interrupted_upload_resumes_from_progress_file(stub_server, video):
+    # The third chunk is rejected with a non-retryable error, which ends the first attempt.
+    cloudinary = FakeCloudinary(os.path.getsize(video), fail_at={2000: 400})
+    server = stub_server(cloudinary)
+    uploader = CloudinaryUploader(server.url, CHUNK_SIZE)
+
+    assert uploader.upload_video(video, "post_1") is None
+    with open(f"{video}.upload.json") as f:
+        progress = json.load(f)
+    assert progress['offset'] == 2000
+
+    assert uploader.upload_video(video, "post_1") == "https://res.example/post_1.mp4"
+    # The retry continued the same upload at the first unacknowledged byte.
+    assert [start for _, start, _ in cloudinary.ranges] == [0, 1000, 2000, 2000, 3000]
+    assert {upload_id for upload_id, _, _ in cloudinary.ranges} == {progress['upload_id']}
+    with open(video, 'rb') as f:
+        assert cloudinary.assembled(progress['upload_id']) == f.read()
+    assert not os.path.exists(f"{video}.upload.json")
+
+def test_server_errors_are_retried_per_chunk(stub_server, video, monkeypatch):
+    monkeypatch.setattr(publishing_engine.random, "uniform", lambda low, high: 0)
+    cloudinary = FakeCloudinary(os.path.getsize(video), fail_at={1000: 503})
+    server = stub_server(cloudinary)
+
+    assert CloudinaryUploader(server.url, CHUNK_SIZE).upload_video(video, "post_1") == "https://res.example/post_1.mp4"
+    assert [start for _, start, _ in cloudinary.ranges] == [0, 1000, 1000, 2000, 3000]
+    assert metrics.current().counters[("retries_total", (("component", "upload"),))] == 1
+
+def graph_server(stub_server, statuses):
+    """Graph API stand-in: container status polls return `statuses` in turn (the last one repeats)."""
+    statuses = list(statuses)
+
+    def respond(request):
+        if request['method'] == "POST" and request['path'] == "/1789/media":
+            return 200, {"Content-Type": "application/json"}, '{"id": "container_1"}'
+        if request['method'] == "GET" and request['path'].startswith("/container_1?"):
+            status = statuses.pop(0) if len(statuses) > 1 else statuses[0]
+            return 200, {"Content-Type": "application/json"}, json.dumps({"status_code": status, "status": f"{status}: details"})
+        if request['method'] == "POST" and request['path'] == "/1789/media_publish":
+            return 200, {"Content-Type": "application/json"}, '{"id": "media_1"}'
+        return 404, {}, ""
+    return stub_server(respond)
+
+def published(server):
+    return [request for request in server.requests if request['path'] == "/1789/media_publish"]
+
+def test_container_is_published_once_finished(stub_server):
+    server = graph_server(stub_server, ["IN_PROGRESS", "IN_PROGRESS", "FINISHED"])
+    media_id = asyncio.run(InstagramPoster(server.url).post_reel_async("https://res.example/post_1.mp4", "caption"))
+
+    assert media_id == "media_1"
+    assert sum(request['method'] == "GET" for request in server.requests) == 3
+    assert len(published(server)) == 1
+
+def test_container_error_is_not_published(stub_server):
+    server = graph_server(stub_server, ["IN_PROGRESS", "ERROR"])
+    assert asyncio.run(InstagramPoster(server.url).post_reel_async("https://res.example/post_1.mp4", "caption")) is None
+    assert not published(server)
+
+def test_container_polling_times_out(stub_server, monkeypatch):
+    monkeypatch.setattr(publishing_engine, "PUBLISH_TIMEOUT_SECONDS", 0.2)
+    server = graph_server(stub_server, ["IN_PROGRESS"])
+    assert asyncio.run(InstagramPoster(server.url).post_reel_async("https://res.example/post_1.mp4", "caption")) is None
+    assert sum(request['method'] == "GET" for request in server.requests) > 1
+    assert not published(server)
@@ -0,0 +1,40 @@
+# tests/test_worker.py
+import time
+from worker import JobQueue
+
+def expire_lease(queue, job_id):
+    with queue._connect() as conn:
+        conn.execute("UPDATE jobs SET started_at = ? WHERE id = ?", (time.time() - 3600, job_id))
+
+def test_stale_job_is_requeued_while_it_has_attempts_left(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    job_id = queue.enqueue({}, max_attempts=2)
+    queue.claim("worker-a")
+    expire_lease(queue, job_id)
+
+    assert queue.requeue_stale(max_age=60) == (1, 0)
+    job = queue.get(job_id)
+    assert job['status'] == "queued" and job['error'] == "worker lost"
+
+def test_stale_job_fails_after_max_attempts(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    job_id = queue.enqueue({}, max_attempts=2)
+    for _ in range(2):
+        # The worker dies mid-job every time, e.g. ffmpeg is OOM-killed.
+        assert queue.claim("worker-a")['id'] == job_id
+        expire_lease(queue, job_id)
+        queue.requeue_stale(max_age=60)
+
+    job = queue.get(job_id)
+    assert job['status'] == "failed" and job['attempts'] == 2
+    assert job['error'] == "lease expired after max attempts"
+    assert queue.claim("worker-b") is None
+
+def test_heartbeat_keeps_a_running_job_claimed(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    job_id = queue.enqueue({})
+    queue.claim("worker-a")
+    expire_lease(queue, job_id)
+    assert queue.heartbeat(job_id, "worker-a")
+    assert queue.requeue_stale(max_age=60) == (0, 0)
+    assert queue.get(job_id)['status'] == "running"
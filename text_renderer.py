@@ -0,0 +1,89 @@
+# text_renderer.py
+# Pillow-based text rasterizer. Replaces moviepy TextClip, which shells out to ImageMagick per clip.
+import hashlib
+import os
+from functools import lru_cache
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from config import TEXT_CACHE_DIR
+from file_utils import atomic_write
+import metrics
+
+@lru_cache(maxsize=None)
+def load_font(font_path, size):
+    """Fonts are parsed once per (file, size) and reused for every word and reel."""
+    return ImageFont.truetype(font_path, size)
+
+def wrap_text(text, font, max_width):
+    """Greedy word wrap using the font's real advance widths."""
+    lines, current = [], ""
+    for word in text.split():
+        candidate = f"{current} {word}" if current else word
+        if current and font.getlength(candidate) > max_width:
+            lines.append(current)
+            current = word
+        else:
+            current = candidate
+    if current:
+        lines.append(current)
+    return lines or [""]
+
+class TextRenderer:
+    """Renders text to RGBA numpy arrays, cached in memory and optionally as PNGs on disk."""
+    def __init__(self, disk_cache_dir=TEXT_CACHE_DIR):
+        self.disk_cache_dir = disk_cache_dir
+        self._cache = {}
+        if self.disk_cache_dir:
+            os.makedirs(self.disk_cache_dir, exist_ok=True)
+
+    def _disk_path(self, key):
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.disk_cache_dir, f"{digest}.png")
+
+    def _draw(self, text, font_path, size, color, max_width, line_spacing):
+        font = load_font(font_path, size)
+        lines = wrap_text(text, font, max_width) if max_width else [text]
+        ascent, descent = font.getmetrics()
+        line_height = int((ascent + descent) * line_spacing)
+        widths = [int(np.ceil(font.getlength(line))) for line in lines]
+        width = int(max_width) if max_width else max(widths) + 2
+        height = line_height * (len(lines) - 1) + ascent + descent
+
+        image = Image.new("RGBA", (max(width, 1), max(height, 1)), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(image)
+        for i, (line, line_width) in enumerate(zip(lines, widths)):
+            draw.text(((width - line_width) / 2, i * line_height), line, font=font, fill=color)
+        return image
+
+    def render(self, text, font_path, size, color, max_width=None, line_spacing=1.1):
+        """Returns a read-only RGBA uint8 array. With max_width the text is wrapped and centered in that width."""
+        key = (text, font_path, size, color, max_width, line_spacing)
+        cached = self._cache.get(key)
+        metrics.cache_lookup("text", cached is not None)
+        if cached is not None:
+            return cached
+
+        disk_path = self._disk_path(key) if self.disk_cache_dir else None
+        if disk_path and os.path.exists(disk_path):
+            metrics.cache_lookup("text_disk", True)
+            image = Image.open(disk_path).convert("RGBA")
+            os.utime(disk_path) # The media cache prunes this folder by modification time
+        else:
+            metrics.cache_lookup("text_disk", False)
+            image = self._draw(text, font_path, size, color, max_width, line_spacing)
+            if disk_path:
+                with atomic_write(disk_path, 'wb') as f:
+                    image.save(f, format="PNG")
+
+        array = np.asarray(image)
+        array.flags.writeable = False
+        self._cache[key] = array
+        return array
+
+_default_renderer = None
+
+def render_text(text, font_path, size, color, max_width=None):
+    global _default_renderer
+    if _default_renderer is None:
+        _default_renderer = TextRenderer()
+    return _default_renderer.render(text, font_path, size, color, max_width)
@@ -1,9 +1,18 @@
 # video_engine.py
-import moviepy.editor as mp
-from moviepy.video.fx.all import crop
-from PIL import Image, ImageDraw
-import random
-from config import REEL_DURATION_SECONDS, LOGO_PATH, LOGO_WIDTH
+from PIL import Image, ImageColor, ImageDraw
+import numpy as np
+import os
+import time
+from contextlib import ExitStack
+from functools import lru_cache
+from config import (REEL_WIDTH, REEL_HEIGHT, REEL_DURATION_SECONDS, LOGO_PATH, LOGO_WIDTH, DEFAULT_ENCODING_PROFILE,
+                    PREVIEW_SCALE, PREVIEW_FPS, OUTPUT_VARIANTS)
+from text_renderer import render_text
+from compositor import TimelineCompositor
+from encoder import FFmpegEncoder, crop_scale_filter
+from source_cache import normalize_source
+from audio_library import AudioLibrary
+import metrics
 
 def create_rounded_mask(size, radius):
     mask = Image.new('L', size, 0)
@@ -11,90 +20,176 @@ def create_rounded_mask(size, radius):
     draw.rounded_rectangle((0, 0) + size, radius, fill=255)
     return mask
 
-def create_glassmorphism_reel(video_clip, hook_text, revelation_text, style_params):
-    card_w, card_h = 980, 1200
-    card_size = (card_w, card_h)
-
-    glass_card = mp.ColorClip(size=card_size, color=style_params['card_color']).set_opacity(style_params['card_opacity'])
-    mask_clip = mp.ImageClip(list(create_rounded_mask(card_size, 50).getdata()), size=card_size, ismask=True)
-    glass_card.set_mask(mask_clip)
+@lru_cache(maxsize=8)
+def load_logo(width=LOGO_WIDTH):
+    """The logo is decoded and resized once per process instead of once per reel."""
+    logo = Image.open(LOGO_PATH).convert('RGBA')
+    height = round(logo.height * width / logo.width)
+    array = np.asarray(logo.resize((width, height), Image.LANCZOS))
+    array.flags.writeable = False
+    return array
+
+def reel_size(scale=1.0):
+    """Output frame size at `scale`, rounded to even dimensions for yuv420p."""
+    return (round(REEL_WIDTH * scale / 2) * 2, round(REEL_HEIGHT * scale / 2) * 2)
+
+def scale_style(style_params, scale):
+    """Copy of an EDITING_STYLES entry with font sizes scaled; layouts read the same 'scale' for their geometry."""
+    scaled = dict(style_params, scale=scale)
+    for key in ('font_size_hook', 'font_size_revelation'):
+        scaled[key] = max(1, round(style_params[key] * scale))
+    return scaled
+
+def premultiply(rgba):
+    """uint8 RGBA -> float32 premultiplied RGBA in [0, 1]."""
+    layer = rgba.astype(np.float32) / 255.0
+    layer[..., :3] *= layer[..., 3:]
+    return layer
+
+def paste_over(dest, layer, x, y):
+    """Alpha-composites a premultiplied layer onto a premultiplied canvas in place, clipped to the canvas."""
+    h, w = layer.shape[:2]
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + w, dest.shape[1]), min(y + h, dest.shape[0])
+    if x0 >= x1 or y0 >= y1:
+        return
+    src = layer[y0 - y:y1 - y, x0 - x:x1 - x]
+    region = dest[y0:y1, x0:x1]
+    region *= 1.0 - src[..., 3:]
+    region += src
+
+def build_glassmorphism_overlay(hook_text, revelation_text, style_params, size=(REEL_WIDTH, REEL_HEIGHT)):
+    """Pre-composites the card, text and logo into one premultiplied RGBA layer of the given frame size."""
+    width, height = size
+    scale = style_params.get('scale', 1.0)
+    card_w, card_h = round(980 * scale), round(1200 * scale)
+    card_x, card_y = (width - card_w) // 2, (height - card_h) // 2
+    overlay = np.zeros((height, width, 4), dtype=np.float32)
+
+    card = np.zeros((card_h, card_w, 4), dtype=np.float32)
+    card[..., 3] = np.asarray(create_rounded_mask((card_w, card_h), round(50 * scale)), dtype=np.float32) / 255.0 * style_params['card_opacity']
+    card[..., :3] = np.array(ImageColor.getrgb(style_params['card_color']), dtype=np.float32) / 255.0 * card[..., 3:]
+    paste_over(overlay, card, card_x, card_y)
 
     text_w = card_w * 0.9
-    hook_clip = mp.TextClip(hook_text.upper(), fontsize=style_params['font_size_hook'], color=style_params['text_color'], font=style_params['font_hook'], size=(text_w, None), method='caption')
-    revelation_clip = mp.TextClip(revelation_text, fontsize=style_params['font_size_revelation'], color=style_params['text_color'], font=style_params['font_revelation'], size=(text_w, None), method='caption')
-    logo_clip = mp.ImageClip(LOGO_PATH).resize(width=LOGO_WIDTH)
+    hook = premultiply(render_text(hook_text.upper(), style_params['font_hook'], style_params['font_size_hook'], style_params['text_color'], max_width=text_w))
+    revelation = premultiply(render_text(revelation_text, style_params['font_revelation'], style_params['font_size_revelation'], style_params['text_color'], max_width=text_w))
+    logo = premultiply(load_logo(round(LOGO_WIDTH * scale)))
 
-    content_on_card = mp.CompositeVideoClip([
-        hook_clip.set_position(('center', 100)),
-        revelation_clip.set_position(('center', hook_clip.h + 150)),
-        logo_clip.set_position(('center', card_h - logo_clip.h - 50))
-    ], size=card_size, use_bgclip=False).set_position('center')
+    paste_over(overlay, hook, card_x + (card_w - hook.shape[1]) // 2, card_y + round(100 * scale))
+    paste_over(overlay, revelation, card_x + (card_w - revelation.shape[1]) // 2, card_y + hook.shape[0] + round(150 * scale))
+    paste_over(overlay, logo, card_x + (card_w - logo.shape[1]) // 2, card_y + card_h - logo.shape[0] - round(50 * scale))
+    return overlay
 
-    final_clip = mp.CompositeVideoClip([glass_card.set_position('center'), content_on_card])
-    return final_clip.set_duration(video_clip.duration).fadein(0.5).fadeout(0.5)
+def create_glassmorphism_reel(video_clip, hook_text, revelation_text, style_params):
+    # Everything on the card is static, so it is flattened into one layer up front and
+    # each frame only pays for a single alpha blend of the card's bounding box.
+    overlay = build_glassmorphism_overlay(hook_text, revelation_text, style_params, tuple(video_clip.size))
+    compositor = TimelineCompositor(video_clip.size, video_clip.duration, video_clip.fps)
+    compositor.add_layer(overlay, 0, 0, fade_in=0.5, fade_out=0.5, premultiplied=True)
+    return compositor.apply_to(video_clip)
 
 def create_kinetic_reel(video_clip, hook_text, revelation_text, style_params):
-    bg_video = mp.CompositeVideoClip([
-        video_clip,
-        mp.ColorClip(video_clip.size, color=(0,0,0)).set_opacity(style_params['background_opacity'])
-    ]).set_duration(video_clip.duration)
+    compositor = TimelineCompositor(video_clip.size, video_clip.duration, video_clip.fps, background_dim=style_params['background_opacity'])
+    width, height = video_clip.size
+
+    def add_centered(rgba, start, duration, fade_in, fade_out=0.0):
+        x, y = (width - rgba.shape[1]) // 2, (height - rgba.shape[0]) // 2
+        compositor.add_layer(rgba, x, y, start, start + duration, fade_in, fade_out)
 
-    hook_clips, revelation_clips = [], []
     words = hook_text.upper().split()
     start_time = 0.5
     for word in words:
-        clip = mp.TextClip(word, fontsize=style_params['font_size_hook'], color=style_params['text_color'], font=style_params['font_hook'])
-        clip = clip.set_position('center').set_start(start_time).set_duration(2.5).fadein(0.2).fadeout(0.2)
-        hook_clips.append(clip)
+        add_centered(render_text(word, style_params['font_hook'], style_params['font_size_hook'], style_params['text_color']), start_time, 2.5, 0.2, 0.2)
         start_time += 0.3
 
     words = revelation_text.split()
     start_time += 0.2
     for word in words:
         color = style_params['highlight_color'] if len(word) > 4 else style_params['text_color']
-        clip = mp.TextClip(word, fontsize=style_params['font_size_revelation'], color=color, font=style_params['font_revelation'])
-        clip = clip.set_position('center').set_start(start_time).set_duration(0.45).fadein(0.1)
-        revelation_clips.append(clip)
+        add_centered(render_text(word, style_params['font_revelation'], style_params['font_size_revelation'], color), start_time, 0.45, 0.1)
         start_time += 0.25
 
-    logo_clip = mp.ImageClip(LOGO_PATH).resize(width=LOGO_WIDTH)
-    logo_clip = logo_clip.set_position(('center', 'bottom')).set_start(start_time + 0.5).set_duration(3).fadein(0.5)
-
-    return mp.CompositeVideoClip([bg_video] + hook_clips + revelation_clips + [logo_clip])
-
-def create_reel(video_path, music_path, hook_text, revelation_text, output_path, style_params):
+    logo = load_logo(round(LOGO_WIDTH * style_params.get('scale', 1.0)))
+    logo_start = start_time + 0.5
+    compositor.add_layer(logo, (width - logo.shape[1]) // 2, height - logo.shape[0], logo_start, logo_start + 3, fade_in=0.5)
+
+    return compositor.apply_to(video_clip)
+
+def build_reel_clip(video_path, hook_text, revelation_text, style_params, scale=1.0, fps=None, start=0.0):
+    """Returns (source clip, composited clip) at `scale` of the full reel size, optionally resampled to `fps`.
+    The source is used from `start` seconds (see motion_analysis)."""
+    # ffmpeg crops/scales while decoding, so moviepy only ever sees frames of the output size.
+    from moviepy.video.io.VideoFileClip import VideoFileClip
+    video_clip = VideoFileClip(normalize_source(video_path, reel_size(scale), REEL_DURATION_SECONDS, start), audio=False)
+    video_clip = video_clip.set_duration(min(video_clip.duration, REEL_DURATION_SECONDS))
+    if fps:
+        video_clip = video_clip.set_fps(fps)
+    if scale != 1.0:
+        style_params = scale_style(style_params, scale)
+
+    style_function_name = style_params.get("function")
+    if style_function_name == "create_glassmorphism_reel":
+        final_content_clip = create_glassmorphism_reel(video_clip, hook_text, revelation_text, style_params)
+    elif style_function_name == "create_kinetic_reel":
+        final_content_clip = create_kinetic_reel(video_clip, hook_text, revelation_text, style_params)
+    else:
+        raise ValueError(f"Unknown style function: {style_function_name}")
+
+    # Style functions return the full frame (background included), so no extra composite pass is needed.
+    return video_clip, final_content_clip.set_duration(video_clip.duration)
+
+def variant_paths(output_path, variants):
+    """name -> file path for each output variant. The first variant keeps output_path, the rest get a _<name> suffix."""
+    base, extension = os.path.splitext(output_path)
+    return {name: output_path if i == 0 else f"{base}_{name}{extension}" for i, name in enumerate(variants)}
+
+def _render_outputs(video_path, music_path, hook_text, revelation_text, outputs, style_params, scale=1.0, fps=None, preview=False, start=0.0):
+    """Composites the reel once and streams every frame to one encoder per (path, profile, size) in `outputs`.
+    Outputs whose size differs from the composited frame are cropped and scaled by their own ffmpeg."""
+    with metrics.span("layout", preview=preview):
+        video_clip, final_video = build_reel_clip(video_path, hook_text, revelation_text, style_params, scale, fps, start)
+    final_duration = final_video.duration
+
+    # Only the needed window of the track is decoded, by ffmpeg at mux time.
+    audio_start, audio_gain = AudioLibrary().pick_segment(music_path, final_duration)
+    print(f"   - Audio clipped from {audio_start:.2f}s to {audio_start + final_duration:.2f}s (gain {audio_gain:.2f})")
+
+    fps = video_clip.fps or 30
+    audio = {"path": music_path, "start": audio_start, "duration": final_duration, "volume": audio_gain}
+    # Decode + composite and encode alternate per frame, so their times are accumulated separately.
+    compose_seconds = 0.0
+    started = time.perf_counter()
+    with ExitStack() as stack:
+        encoders = []
+        for path, profile, size in outputs:
+            video_filter = crop_scale_filter(*size) if tuple(size) != tuple(final_video.size) else None
+            encoders.append(stack.enter_context(FFmpegEncoder(path, final_video.size, fps, profile, audio=audio, video_filter=video_filter)))
+        frame_started = time.perf_counter()
+        # iter_frames hands back the compositor's reused buffer, so every encoder takes the frame before the next one is built.
+        for frame in final_video.iter_frames(fps=fps, dtype='uint8'):
+            compose_seconds += time.perf_counter() - frame_started
+            for encoder in encoders:
+                encoder.write_frame(frame)
+            frame_started = time.perf_counter()
+    video_clip.close()
+    encode_seconds = time.perf_counter() - started - compose_seconds
+    metrics.observe("compose", compose_seconds)
+    metrics.observe("encode", encode_seconds)
+    for (path, _, _), encoder in zip(outputs, encoders):
+        metrics.inc("frames_rendered_total", encoder.frames_written, style=style_params.get("function"))
+        metrics.log("render", output=path, frames=encoder.frames_written, compose_seconds=round(compose_seconds, 3),
+                    encode_seconds=round(encode_seconds, 3), outputs=len(outputs))
+
+def create_reel(video_path, music_path, hook_text, revelation_text, output_path, style_params, profile=DEFAULT_ENCODING_PROFILE, preview=False, start=0.0):
+    """Renders the reel. preview=True renders the same layout at PREVIEW_SCALE and PREVIEW_FPS with the 'preview' profile."""
     try:
-        video_clip = mp.VideoFileClip(video_path).without_audio()
-        audio_clip = mp.AudioFileClip(music_path).volumex(0.4)
-        final_duration = min(video_clip.duration, REEL_DURATION_SECONDS)
-
-        (w, h) = video_clip.size
-        target_ratio = 1080 / 1920
-        if w / h > target_ratio:
-            video_clip = crop(video_clip, width=int(h * target_ratio), x_center=w/2)
+        if preview:
+            size = reel_size(PREVIEW_SCALE)
+            _render_outputs(video_path, music_path, hook_text, revelation_text, [(output_path, "preview", size)],
+                            style_params, PREVIEW_SCALE, PREVIEW_FPS, preview=True, start=start)
         else:
-            video_clip = crop(video_clip, height=int(w / target_ratio), y_center=h/2)
-        video_clip = video_clip.resize((1080, 1920)).set_duration(final_duration)
-        
-        audio_segment = audio_clip
-        if audio_clip.duration > final_duration:
-            max_start_time = audio_clip.duration - final_duration
-            start_time = random.uniform(0, max_start_time)
-            audio_segment = audio_clip.subclip(start_time, start_time + final_duration)
-            print(f"   - Audio clipped from {start_time:.2f}s to {start_time + final_duration:.2f}s")
-
-        style_function_name = style_params.get("function")
-        if style_function_name == "create_glassmorphism_reel":
-            final_content_clip = create_glassmorphism_reel(video_clip, hook_text, revelation_text, style_params)
-        elif style_function_name == "create_kinetic_reel":
-            final_content_clip = create_kinetic_reel(video_clip, hook_text, revelation_text, style_params)
-        else:
-            raise ValueError(f"Unknown style function: {style_function_name}")
-
-        final_video = mp.CompositeVideoClip([video_clip, final_content_clip])
-        final_video.audio = audio_segment.set_duration(final_duration)
-        final_video.write_videofile(output_path, codec="libx264", audio_codec="aac", temp_audiofile='temp-audio.m4a', remove_temp=True, logger='bar')
-
+            _render_outputs(video_path, music_path, hook_text, revelation_text, [(output_path, profile, reel_size())], style_params, start=start)
         print(f"Reel created successfully at {output_path}")
         return True
 
@@ -103,3 +198,34 @@ def create_reel(video_path, music_path, hook_text, revelation_text, output_path,
         traceback.print_exc()
         print(f"Error creating reel: {e}")
         return False
+
+def create_reel_variants(video_path, music_path, hook_text, revelation_text, output_paths, style_params, start=0.0):
+    """Renders every OUTPUT_VARIANTS entry in `output_paths` (name -> path) from a single decode + composite pass."""
+    try:
+        outputs = []
+        for name, path in output_paths.items():
+            variant = OUTPUT_VARIANTS[name]
+            outputs.append((path, variant['profile'], (variant['width'], variant['height'])))
+        _render_outputs(video_path, music_path, hook_text, revelation_text, outputs, style_params, start=start)
+        for name, path in output_paths.items():
+            print(f"Reel variant '{name}' created at {path}")
+        return True
+
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        print(f"Error creating reel variants: {e}")
+        return False
+
+def render_frame(video_path, hook_text, revelation_text, t, output_path, style_params, scale=1.0, start=0.0):
+    """Renders the single frame at `t` seconds to a PNG (cover images, quick review). Returns True/False."""
+    try:
+        video_clip, final_video = build_reel_clip(video_path, hook_text, revelation_text, style_params, scale, start=start)
+        t = min(max(t, 0.0), final_video.duration - 1.0 / (video_clip.fps or 30))
+        Image.fromarray(np.ascontiguousarray(final_video.get_frame(t), dtype=np.uint8)).save(output_path)
+        video_clip.close()
+        print(f"Frame at {t:.2f}s saved to {output_path}")
+        return True
+    except Exception as e:
+        print(f"Error rendering frame: {e}")
+        return False
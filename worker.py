@@ -0,0 +1,284 @@
+# worker.py
+# Resident worker that renders posts from a local SQLite job queue. The heavy imports, fonts,
+# the resized logo, HTTP sessions and the AI client are set up once and reused for every job.
+#
+#   python worker.py enqueue [--count N] [--category C] [--story-style K] [--edit-style K]
+#   python worker.py run [--once] [--max-jobs N]
+#   python worker.py status
+import argparse
+import json
+import os
+import signal
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from config import (JOB_QUEUE_FILE, WORKER_POLL_SECONDS, JOB_MAX_ATTEMPTS, JOB_STALE_SECONDS, JOB_HEARTBEAT_SECONDS,
+                    CONTENT_SOURCES, STORYTELLING_STYLES, EDITING_STYLES)
+from file_utils import sqlite_connection
+
+class JobQueue:
+    """Durable FIFO of post jobs. Any process (cron, main.py, a shell) can enqueue; workers claim atomically."""
+    def __init__(self, db_file=JOB_QUEUE_FILE):
+        self.db_file = db_file
+        os.makedirs(os.path.dirname(self.db_file), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                status TEXT NOT NULL DEFAULT 'queued',
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                worker TEXT,
+                result TEXT,
+                error TEXT)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+
+    def _connect(self):
+        return sqlite_connection(self.db_file)
+
+    def _to_job(self, row):
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def enqueue(self, payload=None, max_attempts=JOB_MAX_ATTEMPTS):
+        with self._connect() as conn:
+            cursor = conn.execute("INSERT INTO jobs (payload, max_attempts, created_at) VALUES (?, ?, ?)",
+                                  (json.dumps(payload or {}), max_attempts, time.time()))
+            return cursor.lastrowid
+
+    def claim(self, worker_id):
+        """Marks the oldest queued job as running and returns it, or None if the queue is empty."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE") # Take the write lock first so two workers can't claim the same row
+            row = conn.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+            if not row:
+                return None
+            conn.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ?, worker = ? WHERE id = ?",
+                         (time.time(), worker_id, row['id']))
+            return self._to_job(conn.execute("SELECT * FROM jobs WHERE id = ?", (row['id'],)).fetchone())
+
+    def heartbeat(self, job_id, worker_id):
+        """Refreshes started_at of a job this worker is still running, so requeue_stale leaves it alone."""
+        with self._connect() as conn:
+            cursor = conn.execute("UPDATE jobs SET started_at = ? WHERE id = ? AND status = 'running' AND worker = ?",
+                                  (time.time(), job_id, worker_id))
+            return cursor.rowcount == 1
+
+    def complete(self, job_id, result):
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET status = 'done', finished_at = ?, result = ?, error = NULL WHERE id = ?",
+                         (time.time(), json.dumps(result), job_id))
+
+    def fail(self, job_id, error):
+        """Requeues the job if it has attempts left, otherwise marks it failed. Returns the new status."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            status = 'queued' if row and row['attempts'] < row['max_attempts'] else 'failed'
+            conn.execute("UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE id = ?", (status, time.time(), error, job_id))
+            return status
+
+    def requeue_stale(self, max_age=JOB_STALE_SECONDS):
+        """Jobs left 'running' by a worker that died (no heartbeat for `max_age` seconds) are put back in the queue,
+        unless they have used up their attempts: a job that keeps crashing its worker is failed instead of retried forever.
+        Returns (requeued, failed)."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            failed = conn.execute("""UPDATE jobs SET status = 'failed', finished_at = ?, error = 'lease expired after max attempts'
+                                     WHERE status = 'running' AND started_at < ? AND attempts >= max_attempts""",
+                                  (now, now - max_age)).rowcount
+            requeued = conn.execute("UPDATE jobs SET status = 'queued', error = 'worker lost' WHERE status = 'running' AND started_at < ?",
+                                    (now - max_age,)).rowcount
+            return requeued, failed
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            return self._to_job(row) if row else None
+
+    def counts(self):
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def recent(self, limit=10):
+        with self._connect() as conn:
+            return [self._to_job(row) for row in conn.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,))]
+
+class ReelWorker:
+    def __init__(self, queue=None, poll_interval=WORKER_POLL_SECONDS):
+        # Imported here so `worker.py enqueue` and `status` stay instant.
+        from content_engine import ContentFetcher
+        from ai_engine import AIProcessor
+        from media_engine import MediaFetcher
+        from state_manager import StateManager
+
+        print("🚀 Starting NextGen Signals reel worker...")
+        self.queue = queue or JobQueue()
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.stopping = False
+
+        # Long-lived clients: pooled HTTP sessions, the OpenAI client and the response cache.
+        self.state_manager = StateManager()
+        self.content_fetcher = ContentFetcher()
+        self.ai_processor = AIProcessor()
+        self.media_fetcher = MediaFetcher()
+        self._warm_up()
+
+    def _warm_up(self):
+        """Loads the logo and every style's fonts into the process-wide caches and indexes new music before the first job."""
+        from audio_library import AudioLibrary
+        from text_renderer import load_font
+        from video_engine import load_logo
+        load_logo()
+        for style in EDITING_STYLES.values():
+            load_font(style['font_hook'], style['font_size_hook'])
+            load_font(style['font_revelation'], style['font_size_revelation'])
+        AudioLibrary().build()
+        print("-> Worker warm: fonts, logo, music index and API clients loaded.")
+
+    def _plan(self, payload):
+        """The next planned post, with any category/style overrides from the job payload applied."""
+        plan = self.state_manager.reserve_next_slot()
+        if payload.get('category'):
+            plan['category'] = payload['category']
+        if payload.get('story_style'):
+            plan['story_key'] = payload['story_style']
+            plan['story_prompt'] = STORYTELLING_STYLES[payload['story_style']]
+        if payload.get('edit_style'):
+            plan['edit_key'] = payload['edit_style']
+            plan['edit_params'] = EDITING_STYLES[payload['edit_style']]
+        return plan
+
+    @contextmanager
+    def _heartbeat(self, job):
+        """Keeps the job's started_at fresh from a background thread while the body runs."""
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(JOB_HEARTBEAT_SECONDS):
+                try:
+                    self.queue.heartbeat(job['id'], self.worker_id)
+                except sqlite3.Error as e:
+                    print(f"   - Heartbeat for job {job['id']} failed: {e}")
+
+        thread = threading.Thread(target=beat, name=f"heartbeat-{job['id']}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def run_job(self, job):
+        """Produces one post. Returns a result dict; raises on failure."""
+        from main import prepare_post, render_post, finalize_post
+        from analysis_engine import run_weekly_analysis
+        import metrics
+
+        metrics.start_run(f"job{job['id']}_attempt{job['attempts']}")
+        started = time.time()
+        try:
+            # Other processes may have run the weekly analysis since the last job.
+            self.state_manager.reload()
+            run_weekly_analysis(self.state_manager)
+
+            plan = self._plan(job['payload'])
+            print(f"🎬 [job {job['id']}] Category: {plan['category']} | Story: '{plan['story_key']}' | Edit: '{plan['edit_key']}'")
+            post = prepare_post(plan, self.content_fetcher, self.ai_processor, self.media_fetcher)
+            if not post:
+                raise RuntimeError("Could not prepare post (article, script or media missing)")
+            if not render_post(post):
+                raise RuntimeError("Failed to create video file")
+            finalize_post(post, self.ai_processor, self.state_manager)
+            return {
+                "post_id": post['post_id'],
+                "output_video_path": post['output_video_path'],
+                "variant_paths": post.get('variant_paths'),
+                "hook": post['hook'],
+                "seconds": round(time.time() - started, 2)
+            }
+        finally:
+            metrics.finish_run()
+
+    def stop(self, *args):
+        print("-> Stop requested, finishing the current job first.")
+        self.stopping = True
+
+    def run(self, once=False, max_jobs=None):
+        signal.signal(signal.SIGTERM, self.stop)
+        processed = 0
+        while not self.stopping and (max_jobs is None or processed < max_jobs):
+            # Checked on every poll, so jobs of a crashed worker come back without a restart.
+            requeued, failed = self.queue.requeue_stale()
+            if requeued:
+                print(f"-> Requeued {requeued} stale job(s).")
+            if failed:
+                print(f"-> Failed {failed} stale job(s) that had no attempts left.")
+            job = self.queue.claim(self.worker_id)
+            if not job:
+                if once:
+                    break
+                time.sleep(self.poll_interval)
+                continue
+
+            try:
+                with self._heartbeat(job):
+                    result = self.run_job(job)
+                self.queue.complete(job['id'], result)
+                print(f"✅ [job {job['id']}] Done in {result['seconds']}s: {result['output_video_path']}")
+            except KeyboardInterrupt:
+                self.queue.fail(job['id'], "interrupted")
+                raise
+            except Exception as e:
+                traceback.print_exc()
+                status = self.queue.fail(job['id'], f"{type(e).__name__}: {e}")
+                print(f"-> [job {job['id']}] Failed ({e}), {'requeued' if status == 'queued' else 'giving up'}.")
+            processed += 1
+        print(f"\n✨ Worker stopped after {processed} job(s).")
+
+def main():
+    parser = argparse.ArgumentParser(description="NextGen Signals reel worker and job queue")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = commands.add_parser("enqueue", help="Add post jobs to the queue.")
+    enqueue.add_argument("--count", type=int, default=1)
+    enqueue.add_argument("--category", choices=list(CONTENT_SOURCES))
+    enqueue.add_argument("--story-style", choices=list(STORYTELLING_STYLES))
+    enqueue.add_argument("--edit-style", choices=list(EDITING_STYLES))
+    enqueue.add_argument("--max-attempts", type=int, default=JOB_MAX_ATTEMPTS)
+
+    run = commands.add_parser("run", help="Process jobs until stopped.")
+    run.add_argument("--once", action="store_true", help="Exit when the queue is empty instead of polling.")
+    run.add_argument("--max-jobs", type=int, help="Exit after this many jobs.")
+    run.add_argument("--poll-interval", type=float, default=WORKER_POLL_SECONDS)
+
+    commands.add_parser("status", help="Show queue counts and the latest jobs.")
+    args = parser.parse_args()
+
+    queue = JobQueue()
+    if args.command == "enqueue":
+        payload = {key: value for key, value in (("category", args.category), ("story_style", args.story_style), ("edit_style", args.edit_style)) if value}
+        ids = [queue.enqueue(payload, args.max_attempts) for _ in range(args.count)]
+        print(f"-> Enqueued {len(ids)} job(s): {', '.join(map(str, ids))}")
+    elif args.command == "run":
+        try:
+            ReelWorker(queue, args.poll_interval).run(args.once, args.max_jobs)
+        except KeyboardInterrupt:
+            print("\n-> Worker interrupted.")
+    else:
+        print(f"-> Queue: {queue.counts() or 'empty'}")
+        for job in queue.recent():
+            detail = job['error'] or (job['result'] or {}).get('output_video_path') or ""
+            print(f"   - #{job['id']} {job['status']} (attempt {job['attempts']}/{job['max_attempts']}) {job['payload'] or ''} {detail}")
+
+if __name__ == "__main__":
+    main()